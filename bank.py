@@ -0,0 +1,274 @@
+import os
+import re
+import json
+import time
+import shutil
+import threading
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from cache import fingerprint
+from synthesis import getEngine, applyEnvelope, FADE_IN_FRAMES, BLOCK_FRAMES
+from frequencies import freqList as fq
+from render import renderVoice, SUSTAIN_MULT
+
+BANK_VERSION = 1 # bumped whenever the synthesis changes in a way that makes old banks sound different
+DEFAULT_VELOCITIES = (32, 64, 96, 127)
+DEFAULT_MULTS = (1, SUSTAIN_MULT)
+LOCAL = threading.local() # per thread scratch used by fitSample()
+
+def getBankName(harmonics : list, synthMode : str, samplingRate : int):
+    # the directory name of a bank, everything that changes the samples is part of it
+    return f"v{BANK_VERSION}-{synthMode}-{samplingRate}-{fingerprint(harmonics)}"
+
+def getSampleName(note : int, velocity : int, mult : float):
+    return f"{note}_{velocity}_{float(mult)}.npy"
+
+def buildBank(root : str,
+              harmonics : list,
+              synthMode : str = "Recurrence",
+              samplingRate : int = 44100,
+              velocities : tuple = DEFAULT_VELOCITIES,
+              mults : tuple = DEFAULT_MULTS,
+              processes : int = None,
+              cancelled = None):
+    """
+        ## buildBank()
+        renders every key of frequencies.freqList at every velocity and sustain layer with a pool of worker processes and saves them as int16 .npy files
+        in root/getBankName(). The bank is built in a temporary directory and moved into place when it is done, so a half built bank is never opened.
+        Returns the bank's directory, or None if the build was cancelled.
+
+        ### root : str
+        the directory the banks are kept in
+
+        ### harmonics : list
+        the harmonics of the string
+
+        ### velocities : tuple
+        the MIDI velocities to render every key at
+        defaults to DEFAULT_VELOCITIES
+
+        ### mults : tuple
+        the sustain multipliers to render every key at (1 is no sustain)
+        defaults to DEFAULT_MULTS
+
+        ### processes : int
+        amount of worker processes, one per cpu if None
+        defaults to None
+
+        ### cancelled : function
+        checked between samples, when it returns True the renders that haven't started are dropped and the half built bank is deleted
+        defaults to None
+    """
+    directory = os.path.join(root, getBankName(harmonics, synthMode, samplingRate))
+    if os.path.exists(directory):
+        return directory
+
+    building = f"{directory}.building-{os.getpid()}-{threading.get_ident()}"
+    os.makedirs(building, exist_ok=True)
+
+    # the same velocity -> strength and duration mapping as Note.playMidiNotes
+    layers = [(note, velocity, mult) for note in fq for velocity in velocities for mult in mults]
+    # spawned rather than forked, the bank is built from a background thread of a process that has pygame's threads running
+    with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(renderVoice, synthMode, fq[note], (velocity / 100) * mult, velocity / 100, harmonics, samplingRate) for note, velocity, mult in layers]
+        for (note, velocity, mult), future in zip(layers, futures):
+            if cancelled != None and cancelled():
+                pool.shutdown(cancel_futures=True) # only waits for the renders that are already running
+                shutil.rmtree(building, ignore_errors=True)
+                return None
+            np.save(os.path.join(building, getSampleName(note, velocity, mult)), future.result())
+
+    with open(os.path.join(building, "manifest.json"), "w") as file:
+        json.dump({
+            "version" : BANK_VERSION,
+            "synthMode" : synthMode,
+            "samplingRate" : samplingRate,
+            "harmonics" : list(harmonics),
+            "notes" : list(fq),
+            "velocities" : list(velocities),
+            "mults" : list(mults),
+        }, file)
+
+    try:
+        os.rename(building, directory)
+    except OSError: # another build finished first
+        shutil.rmtree(building, ignore_errors=True)
+    return directory
+
+def fitSample(sample : np.array, frames : int, fadeOutFrames : int = None, out : np.array = None):
+    """
+        ## fitSample()
+        returns the first frames of a sample as an int16 wave, with the sample's envelope (synthesis.applyEnvelope()) swapped for the one a note of frames would have.
+        frames can be at most len(sample). The sound under the envelope doesn't depend on the length of the note, so this is the shorter note up to rounding.
+        Both envelopes are the same until the shorter note starts fading out, so those frames are copied as they are and only the rest is worked out, a block at a time in float32.
+
+        ### out : np.array
+        int16 array of frames to write into, a new one if None
+        defaults to None
+    """
+    out = np.empty(frames, dtype=np.int16) if out is None else out
+    fadeIn = min(FADE_IN_FRAMES, frames)
+    fadeOutStart = fadeIn if fadeOutFrames is None else max(fadeIn, frames - fadeOutFrames)
+    unchanged = fadeOutStart if frames >= FADE_IN_FRAMES else 0 # shorter notes have a shorter fade in too
+    out[:unchanged] = sample[:unchanged]
+
+    scratch = getattr(LOCAL, "fitScratch", None)
+    if scratch is None:
+        scratch = LOCAL.fitScratch = np.empty((2, BLOCK_FRAMES), dtype=np.float32)
+    for start in range(unchanged, frames, BLOCK_FRAMES):
+        end = min(frames, start + BLOCK_FRAMES)
+        block, rendered = scratch[:, :end - start]
+        np.copyto(block, sample[start:end])
+        applyEnvelope(block, frames, start, fadeOutFrames)
+        rendered.fill(1)
+        applyEnvelope(rendered, len(sample), start, fadeOutFrames) # never below the wanted envelope, the longer note fades out later
+        np.divide(block, rendered, out=block, where=rendered > 0)
+        np.rint(block, out=block)
+        np.clip(block, -32768, 32767, out=block)
+        np.copyto(out[start:end], block, casting="unsafe")
+    return out
+
+class SampleBank:
+    def __init__(self, directory : str):
+        """
+            ## SampleBank
+            a bank made by buildBank(). Samples are opened as memory maps the first time they are played, so opening a bank doesn't read any audio.
+
+            ### directory : str
+            the bank's directory
+        """
+        self.directory = directory
+        with open(os.path.join(directory, "manifest.json")) as file:
+            self.manifest = json.load(file)
+        if self.manifest["version"] != BANK_VERSION:
+            raise ValueError(f"{directory} is a version {self.manifest['version']} bank, expected version {BANK_VERSION}.")
+
+        self.velocities = np.array(self.manifest["velocities"])
+        self.mults = np.array(self.manifest["mults"])
+        self.samples = {}
+        self.samplingRate = self.manifest["samplingRate"]
+        self.fadeOutFrames = getEngine(self.manifest["synthMode"]).getFadeOutFrames(self.samplingRate) # the envelope the samples were rendered with
+
+    def getSample(self, note : int, velocity : int, mult : float):
+        """
+            ## getSample()
+            returns (wave, gain) for a note, played at gain wave sounds like the synthesized note. Returns (None, None) for notes that aren't in the bank.
+            The sample comes from the quietest velocity layer of the closest sustain layer that is at least as long as the note (velocity / 100 * mult seconds),
+            gain makes up the volume difference between the layer's velocity and the played one. When the layer is exactly the played note, wave is its memory map,
+            otherwise it is a copy cut to the note's length with the note's own envelope, see fitSample().
+        """
+        if note not in fq:
+            return None, None
+
+        layerMult = self.mults[np.argmin(np.abs(self.mults - mult))].item()
+        duration = (velocity / 100) * mult
+        longEnough = self.velocities[self.velocities / 100 * layerMult >= duration]
+        layerVelocity = int(longEnough.min() if len(longEnough) > 0 else self.velocities.max())
+        key = (note, layerVelocity, layerMult)
+        if key not in self.samples:
+            self.samples[key] = np.load(os.path.join(self.directory, getSampleName(*key)), mmap_mode="r")
+
+        sample = self.samples[key]
+        frames = int(duration * self.samplingRate)
+        if frames < len(sample):
+            sample = fitSample(sample, frames, self.fadeOutFrames)
+        gain = min(velocity / 100, 1) / min(layerVelocity / 100, 1) # strength is capped at 1 when synthesizing
+        return sample, gain
+
+class BankManager:
+    def __init__(self, root : str, synthMode : str = "Recurrence", samplingRate : int = 44100, processes : int = None, debounce : float = 1, keepBanks : int = 1):
+        """
+            ## BankManager
+            keeps the sample bank for the current harmonics open, building it in a background thread when it doesn't exist yet.
+            getBank() returns None while there isn't a bank for the current harmonics, notes should be synthesized in the meantime.
+
+            ### debounce : float
+            seconds the harmonics have to stay the same before a build starts, so resetting several times in a row only builds the last bank.
+            A build that is running when the harmonics change again is cancelled.
+            defaults to 1
+
+            ### keepBanks : int
+            how many of the banks in root with this synthMode and samplingRate are kept, the one in use and the most recently used others. The rest are deleted once a new one is opened.
+            defaults to 1
+        """
+        self.root = root
+        self.synthMode = synthMode
+        self.samplingRate = samplingRate
+        self.processes = processes
+        self.debounce = debounce
+        self.keepBanks = keepBanks
+
+        self.name = None # the bank the current harmonics need
+        self.bank = None
+        self.pending = None # (name, harmonics) of the bank that has to be built
+        self.changedAt = 0 # time.perf_counter() of the last time pending changed
+        self.buildThread = None
+        self.lock = threading.Lock()
+
+    def setHarmonics(self, harmonics : list):
+        name = getBankName(harmonics, self.synthMode, self.samplingRate)
+        directory = os.path.join(self.root, name)
+        with self.lock:
+            if name == self.name:
+                return
+            built = os.path.exists(directory) # checked under the lock so prune() can't delete it in between
+            self.name = name # a build of any other bank sees this and stops
+            self.bank = None
+            self.pending = None if built else (name, list(harmonics))
+            self.changedAt = time.perf_counter()
+            if self.pending != None and self.buildThread == None:
+                self.buildThread = threading.Thread(target=self.build)
+                self.buildThread.daemon = True
+                self.buildThread.start()
+
+        if built:
+            self.open(name, directory)
+
+    def build(self):
+        # builds the pending bank once the harmonics stopped changing, until there isn't one left
+        while True:
+            with self.lock:
+                if self.pending == None:
+                    self.buildThread = None
+                    return
+                wait = self.changedAt + self.debounce - time.perf_counter()
+                if wait <= 0:
+                    (name, harmonics), self.pending = self.pending, None
+            if wait > 0:
+                time.sleep(wait)
+                continue
+
+            directory = buildBank(self.root, harmonics, self.synthMode, self.samplingRate, processes=self.processes, cancelled=lambda: self.name != name)
+            if directory != None:
+                self.open(name, directory)
+
+    def open(self, name : str, directory : str):
+        bank = SampleBank(directory)
+        with self.lock:
+            if name != self.name: # only swapped in if the harmonics are still the ones it was made for
+                return
+            self.bank = bank
+        os.utime(directory) # marks it as the most recently used for prune()
+        self.prune()
+
+    def prune(self):
+        """
+            ## prune()
+            deletes the banks in root with this synthMode and samplingRate (of any BANK_VERSION) past the keepBanks most recently used, never the one in use.
+        """
+        pattern = re.compile(rf"v\d+-{re.escape(self.synthMode)}-{self.samplingRate}-[0-9a-f]+")
+        pruning = []
+        with self.lock:
+            # moved out of the way under the lock, so setHarmonics() never opens a bank that is being deleted
+            banks = [name for name in os.listdir(self.root) if pattern.fullmatch(name) and name != self.name]
+            banks.sort(key=lambda name: os.path.getmtime(os.path.join(self.root, name)), reverse=True)
+            for name in banks[max(self.keepBanks - 1, 0):]:
+                directory = os.path.join(self.root, name)
+                pruning.append(f"{directory}.pruning-{os.getpid()}-{threading.get_ident()}")
+                os.rename(directory, pruning[-1])
+        for directory in pruning:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def getBank(self):
+        return self.bank
@@ -0,0 +1,429 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tracemalloc
+import subprocess
+import traceback
+import numpy as np
+from synthesis import getEngine, makeHarmonics, renderNote, renderNoteInto, ENGINES
+
+def timeIt(function, repeats : int = 5):
+    """
+        ## timeIt()
+        returns the best time in seconds out of repeats calls of function.
+    """
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def timeSamples(function, repeats : int = 20):
+    """
+        ## timeSamples()
+        returns the time in seconds of every one of repeats calls of function, for percentiles.
+    """
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def summarize(samples : list):
+    # p50/p99/max of a list of seconds, in ms
+    samples = np.asarray(samples) * 1000
+    return {
+        "p50" : float(np.percentile(samples, 50)),
+        "p99" : float(np.percentile(samples, 99)),
+        "max" : float(samples.max()),
+    }
+
+def benchmarkEngines(harmonicCounts : tuple = (6, 12, 24, 40, 60),
+                     duration : float = 1.5,
+                     frequency : float = 440,
+                     samplingRate : int = 44100,
+                     repeats : int = 5):
+    """
+        ## benchmarkEngines()
+        times every synthesis engine at each amount of harmonics and reports how far their wave is from the original loop's. The wavetable engine is band limited, so it is expected to differ by the harmonics it drops above nyquist.
+        The string engine only starts out as the additive wave and then decays, so its error is expected to be about as large as the wave itself.
+    """
+    frames = int(duration * samplingRate)
+    engines = {name : getEngine(name) for name in ENGINES}
+    results = []
+
+    for harmonicsLen in harmonicCounts:
+        harmonics = makeHarmonics(harmonicsLen)
+        reference = engines["Loop"].render(frequency, harmonics, frames, samplingRate)
+
+        for name, engine in engines.items():
+            seconds = timeIt(lambda: engine.render(frequency, harmonics, frames, samplingRate), repeats)
+            error = np.max(np.abs(engine.render(frequency, harmonics, frames, samplingRate) - reference))
+            results.append({
+                "engine" : name,
+                "harmonics" : harmonicsLen,
+                "ms" : seconds * 1000,
+                "realtime" : duration / seconds, # how many times faster than realtime
+                "maxError" : float(error),
+            })
+
+    return results
+
+def measureMemory(function):
+    """
+        ## measureMemory()
+        returns the peak bytes allocated while running function. numpy reports its arrays to tracemalloc, so the peak includes every temporary array.
+    """
+    function() # warms up caches and scratch pools so they aren't counted
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+def benchmarkAllocations(durations : tuple = (.5, 1.5, 4),
+                         harmonicsLen : int = 40,
+                         engine : str = "Recurrence",
+                         frequency : float = 440,
+                         samplingRate : int = 44100):
+    """
+        ## benchmarkAllocations()
+        compares the peak memory of renderNote() plus the stereo copy makeSound used to make, against renderNoteInto() writing into an already made stereo buffer.
+        Peak memory is also given in note sizes (the bytes of the final stereo int16 note).
+    """
+    synthEngine = getEngine(engine)
+    harmonics = makeHarmonics(harmonicsLen)
+    results = []
+
+    for duration in durations:
+        frames = int(duration * samplingRate)
+        stereo = np.zeros((frames, 2), dtype=np.int16)
+
+        def copying():
+            wave = renderNote(synthEngine, frequency, duration, 1, harmonics, samplingRate)
+            return np.asarray([wave, wave]).T.copy()
+
+        def inPlace():
+            return renderNoteInto(synthEngine, stereo, frequency, 1, harmonics, samplingRate)
+
+        for name, function in (("copying", copying), ("inPlace", inPlace)):
+            peak = measureMemory(function)
+            results.append({
+                "path" : name,
+                "duration" : duration,
+                "peakBytes" : peak,
+                "peakNotes" : peak / stereo.nbytes,
+                "ms" : timeIt(function) * 1000,
+            })
+
+    return results
+
+# ms each module may take to import in a fresh interpreter, numpy alone is most of it. Going over (or pulling in pygame or mido) fails the suite
+IMPORT_BUDGETS_MS = {
+    "synthesis" : 100.0,
+    "mixer" : 100.0,
+    "render" : 150.0,
+    "bank" : 150.0,
+    "notes" : 150.0,
+}
+
+def measureImport(module : str, heavyModules : tuple = ("pygame", "mido")):
+    """
+        ## measureImport()
+        imports module in a fresh interpreter and returns its cumulative import time in ms, which of heavyModules got imported along with it and whether it stayed
+        within its IMPORT_BUDGETS_MS without importing any of them ("ok"). A fresh interpreter is needed since an import is only ever timed once per process.
+    """
+    code = f"import sys, {module}; print(*[name for name in {heavyModules!r} if name in sys.modules])"
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__))) # the modules are imported from next to this file wherever it is run from
+
+    importTime = 0
+    for line in process.stderr.splitlines(): # import time: self [us] | cumulative | imported package
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            importTime = int(parts[1]) / 1000
+    heavy = process.stdout.strip()
+    budget = IMPORT_BUDGETS_MS.get(module, float("inf"))
+    return {
+        "module" : module,
+        "importMs" : importTime,
+        "budgetMs" : budget,
+        "heavy" : heavy or "-",
+        "ok" : importTime <= budget and heavy == "",
+    }
+
+def benchmarkImports(modules : tuple = tuple(IMPORT_BUDGETS_MS)):
+    return [measureImport(module) for module in modules]
+
+def getImportFailures(report : dict):
+    # the rows of the imports benchmark that went over their budget or imported pygame or mido
+    return [row for row in report["results"].get("imports", []) if not row["ok"]]
+
+def setHeadless():
+    # has to happen before pygame is first used, pygame is only loaded once something needs it (see globals.LazyModule)
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+def benchmarkMakeSound(durations : tuple = (.5, 1.5, 4),
+                       harmonicCounts : tuple = (6, 24, 60),
+                       synthModes : tuple = ("Recurrence", "String"),
+                       repeats : int = 10):
+    """
+        ## benchmarkMakeSound()
+        times Note.makeSound (a single cosine) and StringNote.makeSound at every duration, amount of harmonics and engine, with the sound cache cleared every
+        time so every call synthesizes. throughput is seconds of audio made per second.
+    """
+    from notes import Note, StringNote
+    results = []
+
+    for synthMode in synthModes:
+        for duration in durations:
+            note = Note(duration=duration, synthMode=synthMode)
+            notes = [("Note", 1, note)]
+            for harmonicsLen in harmonicCounts:
+                notes.append(("StringNote", harmonicsLen, StringNote(duration=duration, harmonics=makeHarmonics(harmonicsLen, random.Random(harmonicsLen)), synthMode=synthMode)))
+
+            for name, harmonicsLen, note in notes:
+                def makeSound():
+                    note.soundCache.clear()
+                    note.makeSound()
+
+                makeSound() # warm up
+                times = timeSamples(makeSound, repeats)
+                results.append({
+                    "note" : name,
+                    "synthMode" : synthMode,
+                    "duration" : duration,
+                    "harmonics" : harmonicsLen,
+                    **summarize(times),
+                    "throughput" : duration / float(np.median(times)),
+                    "peakBytes" : measureMemory(makeSound),
+                })
+
+    return results
+
+def benchmarkDrawing(drawModes : tuple = ("Lines", "Circles", "Both"),
+                     windowSizes : tuple = ((640, 360), (1280, 720), (1920, 1080)),
+                     duration : float = 1.5,
+                     repeats : int = 20):
+    """
+        ## benchmarkDrawing()
+        times drawFullWave, drawMovingWave (halfway through a note), drawArray on its own and Text.draw at every draw mode and window size.
+    """
+    from globals import pygame
+    from notes import StringNote
+    from voices import Voice
+
+    note = StringNote(duration=duration, harmonics=makeHarmonics(40, random.Random(40)))
+    note.makeSound()
+    results = []
+
+    for width, height in windowSizes:
+        screen = pygame.display.set_mode((width, height))
+        x = np.linspace(0, width, width * 2)
+        y = height / 2 + np.sin(x / 20) * height / 6
+
+        def drawMovingWave():
+            # about the same part of the note every time, the last frame was drawn 1/60 of a second ago
+            note.lastDrawnIndex = int(note.frames / 2 - note.samplingRate / 60)
+            note.drawMovingWave(screen)
+
+        for drawMode in drawModes:
+            note.drawMode = drawMode
+            note.setVoice(Voice(note.frequency, None, note.strength, duration, time.time() - duration / 2, note.wave, note.sound)) # halfway through the note
+            for name, function in (("drawFullWave", lambda: note.drawFullWave(screen)),
+                                   ("drawMovingWave", drawMovingWave),
+                                   ("drawArray", lambda: note.drawArray(x, y, screen)),
+                                   ("Text.draw", lambda: note.text.update(screen, note.getData()))):
+                function()
+                results.append({
+                    "function" : name,
+                    "drawMode" : drawMode,
+                    "window" : f"{width}x{height}",
+                    **summarize(timeSamples(function, repeats)),
+                })
+
+    return results
+
+def benchmarkMixer(polyphonies : tuple = (1, 8, 32, 64),
+                   duration : float = 4,
+                   blocks : int = 200,
+                   samplingRate : int = 44100):
+    """
+        ## benchmarkMixer()
+        times Mixer.callback with polyphony voices playing. realtime is how many times faster than the sound card needs the blocks.
+    """
+    from mixer import Mixer
+
+    wave = renderNote(getEngine("Recurrence"), 440, duration, 1, makeHarmonics(24, random.Random(24)), samplingRate)
+    results = []
+
+    for polyphony in polyphonies:
+        mixer = Mixer(samplingRate, polyphony=polyphony)
+        for _ in range(polyphony):
+            mixer.addVoice(wave, .5)
+        block = mixer.makeBlock()
+        times = timeSamples(lambda: mixer.callback(block), blocks)
+        results.append({
+            "polyphony" : polyphony,
+            **summarize(times),
+            "realtime" : (mixer.blockSize / samplingRate) / float(np.median(times)),
+        })
+
+    return results
+
+def benchmarkMidi(chordSizes : tuple = (1, 3, 6),
+                  chords : int = 30,
+                  chordGap : float = .05,
+                  outputMode : str = "Mixer"):
+    """
+        ## benchmarkMidi()
+        plays chords of every size through a midi.FakePort and reports the latency from a note arriving to it being synthesized and played.
+        Each chord size uses a fresh note, so the first chords miss the sound cache and later ones mostly hit it, like a real performance.
+    """
+    import mido
+    from midi import FakePort
+    from notes import StringNote
+
+    results = []
+    for chordSize in chordSizes:
+        note = StringNote(harmonics=makeHarmonics(40, random.Random(40)), outputMode=outputMode)
+        port = FakePort()
+        ingest = note.keyboardInput(port)
+        rng = random.Random(chordSize)
+
+        for _ in range(chords):
+            root = rng.randint(36, 84)
+            for i in range(chordSize):
+                port.send(mido.Message("note_on", note=root + i * 4, velocity=rng.randint(40, 120)))
+            time.sleep(chordGap)
+        time.sleep(.5) # lets the last chord finish
+
+        for stage in ("synthesis", "play"):
+            latencies = note.latency.getPercentiles(stage, (50, 90, 99))
+            results.append({
+                "chordSize" : chordSize,
+                "stage" : stage,
+                **latencies,
+            })
+        ingest.stop()
+        if note.mixer != None:
+            note.mixer.stop()
+
+    return results
+
+def getMachine():
+    return {
+        "python" : platform.python_version(),
+        "numpy" : np.__version__,
+        "platform" : platform.platform(),
+        "processor" : platform.processor(),
+        "cpus" : os.cpu_count(),
+    }
+
+def runSuite(path : str = None, quick : bool = False):
+    """
+        ## runSuite()
+        runs every benchmark headless (SDL dummy drivers, a fake MIDI port) and returns {"machine", "time", "results" : {benchmark : rows}, "errors" : {benchmark : traceback}},
+        saving it as JSON to path (its directory is made if needed). A benchmark that raises is kept in errors with no rows, the others still run and are saved.
+        quick runs fewer sizes and repeats, for checking the suite itself rather than comparing numbers.
+    """
+    setHeadless()
+    repeats = 3 if quick else 10
+    benchmarks = {
+        "engines" : lambda: benchmarkEngines((6, 60) if quick else (6, 12, 24, 40, 60), repeats=repeats),
+        "allocations" : lambda: benchmarkAllocations((.5, 4) if quick else (.5, 1.5, 4)),
+        "makeSound" : lambda: benchmarkMakeSound((.5, 4) if quick else (.5, 1.5, 4), (6, 60) if quick else (6, 24, 60), repeats=repeats),
+        "drawing" : lambda: benchmarkDrawing(windowSizes=((640, 360), (1920, 1080)) if quick else ((640, 360), (1280, 720), (1920, 1080)), repeats=repeats * 2),
+        "mixer" : lambda: benchmarkMixer((1, 64) if quick else (1, 8, 32, 64), blocks=50 if quick else 200),
+        "midi" : lambda: benchmarkMidi((1, 6) if quick else (1, 3, 6), chords=10 if quick else 30),
+        "imports" : lambda: benchmarkImports(),
+    }
+
+    results = {}
+    errors = {}
+    for name, benchmark in benchmarks.items():
+        print(f"-- {name} --")
+        try:
+            results[name] = benchmark()
+        except Exception:
+            errors[name] = traceback.format_exc()
+            results[name] = []
+            print(errors[name])
+        printResults(results[name])
+
+    report = {
+        "machine" : getMachine(),
+        "time" : time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results" : results,
+        "errors" : errors,
+    }
+    if path != None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as file:
+            json.dump(report, file, indent=1)
+    return report
+
+MEASURED_INTS = ("count", "peakBytes", "ok") # int (and bool) columns that are results rather than what was benchmarked
+
+def compareReports(old : dict, new : dict, metrics : tuple = ("p50", "ms", "importMs")):
+    """
+        ## compareReports()
+        returns a row for every benchmark row that is in both reports with new / old of its time (the first of metrics it has), above 1 is slower.
+        Rows are matched on their non measured columns (engine, duration, drawMode...).
+    """
+    def getIdentity(row):
+        return tuple((column, value) for column, value in row.items() if not isinstance(value, float) and column not in MEASURED_INTS)
+
+    rows = []
+    for name, results in new["results"].items():
+        oldRows = {getIdentity(row) : row for row in old["results"].get(name, [])}
+        for row in results:
+            oldRow = oldRows.get(getIdentity(row))
+            metric = next((metric for metric in metrics if metric in row), None)
+            if oldRow == None or metric == None or not oldRow.get(metric):
+                continue
+            rows.append({
+                "benchmark" : name,
+                "case" : " ".join(str(value) for _, value in getIdentity(row)),
+                "old" : float(oldRow[metric]),
+                "new" : float(row[metric]),
+                "ratio" : row[metric] / oldRow[metric],
+            })
+    return rows
+
+def printResults(results : list):
+    if len(results) == 0:
+        return
+    columns = list(results[0])
+    print(" | ".join(f"{column:>10}" for column in columns))
+    for result in results:
+        print(" | ".join(f"{result[column]:>10.3f}" if isinstance(result[column], float) else f"{str(result[column]):>10}" for column in columns))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs the benchmarks headless and saves the results as JSON.")
+    parser.add_argument("--out", default=os.path.join("benchmarks", "benchmark.json"), help="where to save the results")
+    parser.add_argument("--quick", action="store_true", help="fewer sizes and repeats")
+    parser.add_argument("--compare", default=None, help="an earlier results file to compare against")
+    args = parser.parse_args()
+
+    report = runSuite(args.out, args.quick)
+    if args.compare != None:
+        with open(args.compare) as file:
+            print("-- compared to", args.compare, "--")
+            printResults(compareReports(json.load(file), report))
+
+    failures = getImportFailures(report)
+    if len(failures) > 0:
+        print("-- over the import budget --")
+        printResults(failures)
+    if len(report["errors"]) > 0:
+        print("-- failed --", ", ".join(report["errors"]))
+    if len(failures) > 0 or len(report["errors"]) > 0:
+        sys.exit(1)
@@ -0,0 +1,114 @@
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+
+def fingerprint(values):
+    """
+        ## fingerprint()
+        returns a short, stable hash of a list/array of numbers. Used to key caches on things like a harmonics list without storing the whole list in every key.
+
+        ### values : list|np.array
+        the values to hash, None is allowed and hashes to None
+    """
+    if values is None:
+        return None
+    return hashlib.blake2b(np.asarray(values, dtype=np.float64).tobytes(), digest_size=8).hexdigest()
+
+class SoundCache:
+    def __init__(self,
+                 maxEntries : int = 256,
+                 maxBytes : int = 64 * 1024 * 1024):
+        """
+            ## SoundCache
+            LRU cache of finished (wave, sound) pairs so that repeated notes don't have to be synthesized again.
+
+            ### maxEntries : int
+            the max amount of cached sounds
+
+            ### maxBytes : int
+            the max amount of memory the cached waves and sounds are allowed to take up
+        """
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.lock = threading.Lock() # makeSound is called from both the MIDI thread and the main thread
+
+    def get(self, key):
+        """
+            ## get()
+            returns the cached (wave, sound) pair for key or None if it isn't cached. A hit moves the entry to the most recently used end.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, key, wave : np.array, sound):
+        """
+            ## put()
+            stores a (wave, sound) pair under key, evicting the least recently used entries until it fits.
+        """
+        size = self.sizeOf(wave, sound)
+        if size > self.maxBytes: # would evict everything and still not fit
+            return
+
+        with self.lock:
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key)[2]
+            self.entries[key] = (wave, sound, size)
+            self.bytes += size
+
+            while len(self.entries) > self.maxEntries or self.bytes > self.maxBytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes -= evicted[2]
+                self.evictions += 1
+
+    def sizeOf(self, wave : np.array, sound = None):
+        """
+            ## sizeOf()
+            the bytes an entry keeps alive, worked out once when it is stored. That is the whole buffer wave is a view of (like the left channel of a Sound's stereo buffer,
+            see Note.renderSound()), plus the Sound's own buffer when wave isn't a view into anything.
+        """
+        buffer = wave
+        while isinstance(buffer.base, np.ndarray):
+            buffer = buffer.base
+        size = buffer.nbytes
+        if sound is not None and buffer is wave:
+            size += memoryview(sound).nbytes
+        return size
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def getStats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries" : len(self.entries),
+                "bytes" : self.bytes,
+                "hits" : self.hits,
+                "misses" : self.misses,
+                "evictions" : self.evictions,
+                "hitRate" : self.hits / lookups if lookups > 0 else 0,
+            }
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        # a peek that doesn't count as a hit or a miss and doesn't change the order
+        with self.lock:
+            return key in self.entries
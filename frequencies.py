@@ -3,5 +3,6 @@ for i in range(21, 109):
     n = i - 20
     freqList[i] = 2**((n-49)/12) * 440
 
-for i in range(21, 109):
-    print(i, freqList[i])
\ No newline at end of file
+if __name__ == "__main__":
+    for i in range(21, 109):
+        print(i, freqList[i])
\ No newline at end of file
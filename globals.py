@@ -1,6 +1,8 @@
-import pygame
-
-pygame.font.init()
+import operator
+import functools
+import importlib
+import threading
+import numpy as np
 
 SCREEN_X = 2256/2
 SCREEN_Y = 1504/2
@@ -8,7 +10,52 @@ FPS = 60
 BG_COLOR = (0, 0, 0)
 DEFAULT_COOLDOWN = .125
 cooldown = 0
-FONT = pygame.font.SysFont("Arial", 15)
+
+'''
+- name
+- onLoad
+
+stands in for a module that is only imported (and set up with onLoad) the first time one of its attributes is used, so importing the code that uses it doesn't need a display or audio device.
+'''
+class LazyModule:
+    def __init__(self, name : str, onLoad = None):
+        self.__dict__["name"] = name
+        self.__dict__["onLoad"] = onLoad
+        self.__dict__["module"] = None
+        self.__dict__["lock"] = threading.Lock()
+
+    def load(self):
+        with self.lock:
+            if self.module is None:
+                module = importlib.import_module(self.name)
+                if self.onLoad != None:
+                    self.onLoad(module)
+                self.__dict__["module"] = module
+        return self.module
+
+    def isLoaded(self):
+        return self.module is not None
+
+    def __getattr__(self, attribute):
+        return getattr(self.module if self.module is not None else self.load(), attribute)
+
+    def __setattr__(self, attribute, value):
+        setattr(self.load(), attribute, value)
+
+def initPygame(module):
+    module.init()
+    module.mixer.init()
+
+# pygame is only loaded (and initialized) once something is drawn or played, the synthesis itself only needs numpy
+pygame = LazyModule("pygame", initPygame)
+
+def __getattr__(name):
+    # FONT is made the first time it is used, pygame.font has to be set up before it can be made
+    if name == "FONT":
+        pygame.font.init()
+        font = globals()["FONT"] = pygame.font.SysFont("Arial", 15)
+        return font
+    raise AttributeError(f"module {__name__} has no attribute {name}")
 
 def updateCooldown(delta):
     global cooldown
@@ -32,6 +79,16 @@ def inverseOpp(operation : str):
 
     return inverse[operation]
 
+OPERATIONS = {
+    "+" : operator.add,
+    "-" : operator.sub,
+    "*" : operator.mul,
+    "/" : operator.truediv
+}
+
+def applyOpp(value : float, operation : str, change : float):
+    return OPERATIONS[operation](value, change)
+
 def cammelCase(string : str):
     string = string.replace(" ", "")
     return string[0:1].lower() + string[1:]
@@ -53,4 +110,17 @@ def capColor(color : tuple, minColor : tuple = (0, 0, 0), maxColor : tuple = (25
         else:
             cappedColor[i] = (color[i])
 
-    return (cappedColor[0], cappedColor[1], cappedColor[2])
\ No newline at end of file
+    return (cappedColor[0], cappedColor[1], cappedColor[2])
+
+'''
+- startColor
+- endColor
+- steps
+
+precomputed gradient from startColor to endColor as a tuple of steps colors, already capped to 0-255. Cached since the line colors only change on reset.
+'''
+@functools.lru_cache(maxsize=32)
+def getGradient(startColor : tuple, endColor : tuple, steps : int = 64):
+    percents = np.linspace(0, 1, steps)[:, None]
+    colors = np.clip(np.asarray(startColor) + (np.asarray(endColor) - np.asarray(startColor)) * percents, 0, 255)
+    return tuple(tuple(int(channel) for channel in color) for color in colors)
@@ -1,38 +1,52 @@
+import os
 import pygame
 import globals as gb
 import random
 
 from notes import Note, StringNote
+from profiler import PROFILER
 
-pygame.init()
-pygame.font.init()
-pygame.mixer.init()
+if __name__ == "__main__": # the sample bank's worker processes import this file again, they mustn't open a window
+    pygame.init()
+    pygame.font.init()
+    pygame.mixer.init()
 
-screen = pygame.display.set_mode((gb.SCREEN_X, gb.SCREEN_Y), pygame.RESIZABLE)
-clock = pygame.time.Clock()
-font = pygame.font.SysFont("Arial", 15)
-pygame.mixer.set_num_channels(64)
+    screen = pygame.display.set_mode((gb.SCREEN_X, gb.SCREEN_Y), pygame.RESIZABLE)
+    clock = pygame.time.Clock()
+    font = pygame.font.SysFont("Arial", 15)
+    pygame.mixer.set_num_channels(64)
 
-doExit = False
+    doExit = False
 
-note = StringNote(drawMode="Lines", lineStartColor = (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255)), lineEndColor = (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255)), inputMethod="Laptop")
+    note = StringNote(drawMode="Lines", lineStartColor = (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255)), lineEndColor = (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255)), inputMethod="Laptop", outputMode="Mixer")
 
-note.keyboardInput()
+    note.keyboardInput()
 
-while not doExit:
-    delta = (clock.tick(gb.FPS) / 1000)
+    while not doExit:
+        delta = (clock.tick(gb.FPS) / 1000)
 
-    gb.updateCooldown(delta)
+        gb.updateCooldown(delta)
 
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            doExit = True
+        with PROFILER.scope("frame"):
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    doExit = True
+                if event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_F3: # profiler overlay
+                        PROFILER.toggle()
+                    if event.key == pygame.K_F4: # saves the profiler's timings as a Chrome trace, the overlay says where
+                        PROFILER.exportTrace(os.path.join("benchmarks", "trace.json"))
+                    if event.key == pygame.K_F5: # starts or stops recording the session, the text on screen says where
+                        if note.recorder == None:
+                            note.startRecording()
+                        else:
+                            note.stopRecording()
 
-    screen.fill(gb.BG_COLOR)
+            keys = pygame.key.get_pressed()
 
-    keys = pygame.key.get_pressed()
+            dirtyRects = note.update(keys, screen) # only the parts of the screen that changed
 
-    note.update(keys, screen)
-
-    pygame.display.flip()
-pygame.quit()
\ No newline at end of file
+            with PROFILER.scope("display"):
+                pygame.display.update(dirtyRects)
+    note.stopRecording() # finishes the WAV if the window was closed while recording
+    pygame.quit()
\ No newline at end of file
@@ -0,0 +1,196 @@
+import time
+import queue
+import threading
+import numpy as np
+from collections import deque
+from profiler import PROFILER
+
+class LatencyTracker:
+    def __init__(self, window : int = 1024):
+        """
+            ## LatencyTracker
+            keeps the last window latencies of every stage (in seconds) so rolling percentiles and histograms can be read at any time.
+
+            ### window : int
+            how many of the most recent latencies are kept per stage
+        """
+        self.window = window
+        self.stages = {}
+        self.lock = threading.Lock()
+
+    def record(self, stage : str, seconds : float):
+        with self.lock:
+            if stage not in self.stages:
+                self.stages[stage] = deque(maxlen=self.window)
+            self.stages[stage].append(seconds)
+
+    def getLatencies(self, stage : str):
+        with self.lock:
+            return np.array(self.stages.get(stage, ()))
+
+    def getPercentiles(self, stage : str, percentiles : tuple = (50, 99)):
+        """
+            ## getPercentiles()
+            returns {"p50" : ms, "p99" : ms, ...} for the kept latencies of stage, plus how many there are.
+        """
+        latencies = self.getLatencies(stage)
+        result = {"count" : len(latencies)}
+        for percentile in percentiles:
+            result[f"p{percentile}"] = float(np.percentile(latencies, percentile) * 1000) if len(latencies) > 0 else None
+        return result
+
+    def getHistogram(self, stage : str, bins : int = 20):
+        """
+            ## getHistogram()
+            returns (counts, bin edges in ms) of the kept latencies of stage.
+        """
+        return np.histogram(self.getLatencies(stage) * 1000, bins=bins)
+
+    def getStats(self):
+        with self.lock:
+            stages = list(self.stages)
+        return {stage : self.getPercentiles(stage) for stage in stages}
+
+class FakePort:
+    def __init__(self, name : str = "Fake MIDI Port"):
+        """
+            ## FakePort
+            stands in for a mido input port so MIDI handling can run without hardware. Messages given to send() go to the callback if one is set,
+            the same as a mido port, otherwise they come out of receive() and iter_pending().
+        """
+        self.name = name
+        self.messages = queue.Queue()
+        self.closed = False
+        self._callback = None
+
+    @property
+    def callback(self):
+        return self._callback
+
+    @callback.setter
+    def callback(self, function):
+        self._callback = function
+
+    def send(self, message):
+        callback = self.callback
+        if callback != None:
+            callback(message)
+        else:
+            self.messages.put(message)
+
+    def receive(self, block : bool = True):
+        if self.closed and self.messages.empty():
+            raise OSError("receive() called on a closed port")
+        try:
+            message = self.messages.get(block=block)
+        except queue.Empty:
+            return None
+        if message is None: # put there by close() to wake up a blocked receive()
+            raise OSError("port closed during receive()")
+        return message
+
+    def poll(self):
+        return self.receive(block=False)
+
+    def iter_pending(self):
+        while True:
+            message = self.poll()
+            if message is None:
+                return
+            yield message
+
+    def close(self):
+        self.closed = True
+        self.messages.put(None)
+
+class MidiIngest:
+    def __init__(self, port, note, maxPending : int = 256):
+        """
+            ## MidiIngest
+            reads a MIDI port and plays the notes on another thread. Reading only timestamps messages and puts them in a bounded queue, so a slow synthesis never holds up reading the port.
+            Ports that take a callback (mido's rtmidi and portmidi ports, FakePort) hand every message over from their own thread, others are read by a listener thread
+            blocked in receive(). Nothing wakes up while no MIDI is coming in either way.
+
+            ### port
+            a mido input port (or a FakePort)
+
+            ### note : Note
+            the note that handles the messages, its handleMidiMessage() and playMidiNotes() are called from the worker thread
+
+            ### maxPending : int
+            the most messages waiting to be handled at once, past that new messages are dropped and counted
+        """
+        self.port = port
+        self.note = note
+        self.pending = queue.Queue(maxPending)
+        self.dropped = 0
+        self.errors = 0 # batches that raised while being handled
+
+        self.usesCallback = isinstance(getattr(type(port), "callback", None), property)
+        self.listenerThread = None
+        if not self.usesCallback:
+            self.listenerThread = threading.Thread(target=self.listen)
+            self.listenerThread.daemon = True
+        self.workerThread = threading.Thread(target=self.work)
+        self.workerThread.daemon = True
+
+    def start(self):
+        if self.usesCallback:
+            self.port.callback = self.receive
+        else:
+            self.listenerThread.start()
+        self.workerThread.start()
+        return self
+
+    def stop(self):
+        """
+            ## stop()
+            stops reading the port and waits for the threads to end. A port read through its callback is left open for whoever opened it,
+            any other port is closed since that is what ends a blocking receive().
+        """
+        if self.usesCallback:
+            self.port.callback = None
+        else:
+            self.port.close()
+        self.pending.put(None) # wakes the worker up to end
+        for thread in (self.listenerThread, self.workerThread):
+            if thread != None and thread.is_alive():
+                thread.join()
+
+    def receive(self, message):
+        # the port's callback, called from whichever thread the port reads on
+        try:
+            self.pending.put_nowait((message, time.perf_counter()))
+        except queue.Full:
+            self.dropped += 1
+
+    def listen(self):
+        while True:
+            try:
+                message = self.port.receive()
+            except (OSError, ValueError): # the port was closed by stop()
+                return
+            self.receive(message)
+
+    def work(self):
+        buffer = []
+        while True:
+            batch = [self.pending.get()]
+            while not self.pending.empty():
+                batch.append(self.pending.get_nowait())
+            stopping = None in batch
+            batch = [entry for entry in batch if entry != None]
+
+            try:
+                with PROFILER.scope("midi"):
+                    for message, receivedAt in batch:
+                        self.note.handleMidiMessage(message, buffer, receivedAt)
+                    if len(buffer) > 0:
+                        self.note.playMidiNotes(buffer)
+            except Exception as error: # one bad message shouldn't end MIDI input for good
+                print(f"MidiIngest failed to handle a batch: {error!r}")
+                self.errors += 1
+            buffer.clear()
+
+            if stopping:
+                return
@@ -0,0 +1,506 @@
+import time
+import wave
+import atexit
+import threading
+import numpy as np
+from collections import deque
+from profiler import PROFILER
+
+class MixerVoice:
+    def __init__(self, buffer : np.array, gain : float = 1, startFrame : int = 0, info : dict = None):
+        """
+            ## MixerVoice
+            a note that is being played by the Mixer, keeps its own playback cursor into its buffer.
+
+            ### buffer : np.array
+            mono int16 wave of the note
+
+            ### gain : float
+            volume multiplier for the note
+
+            ### startFrame : int
+            the mixer frame the voice started playing at, used to work out its age
+
+            ### info : dict
+            what the note is (frequency, velocity, ...), only read by listeners like recorder.SessionRecorder
+            defaults to None
+        """
+        self.buffer = buffer
+        self.gain = gain
+        self.startFrame = startFrame
+        self.info = info
+        self.number = None # set by the mixer, counts up from 0 for every voice started
+        self.cursor = 0
+
+    def read(self, row : np.array):
+        """
+            ## read()
+            writes the voice's next len(row) frames into row (zero padded past the end of the voice) and moves the cursor forward.
+        """
+        chunk = self.buffer[self.cursor:self.cursor + len(row)]
+        if self.gain == 1:
+            row[:len(chunk)] = chunk
+        else:
+            np.multiply(chunk, self.gain, out=row[:len(chunk)], casting="unsafe")
+        row[len(chunk):] = 0
+        self.cursor += len(row)
+
+    def getLevel(self, blockSize : int):
+        # the loudest the voice is going to be over the next block
+        upcoming = self.buffer[self.cursor:self.cursor + blockSize]
+        if len(upcoming) == 0:
+            return 0
+        return max(abs(int(upcoming.max())), abs(int(upcoming.min()))) * self.gain
+
+    def skip(self, frames : int):
+        self.cursor += frames
+
+    def isDone(self):
+        return self.cursor >= len(self.buffer)
+
+class StreamVoice(MixerVoice):
+    def __init__(self, chunks, gain : float = 1, startFrame : int = 0, info : dict = None, ahead : int = 2):
+        """
+            ## StreamVoice
+            a voice that is rendered while it plays, a few mono int16 chunks (like the ones from synthesis.streamNote()) ahead of the mixer.
+            The mixer's feed thread renders them (see Mixer.feed()), so the sink's thread only renders a chunk itself when the feeder fell behind or isn't running.
+
+            ### chunks : iterator
+            yields the voice's chunks in order
+
+            ### ahead : int
+            the most chunks rendered ahead of the one being played
+            defaults to 2
+        """
+        super().__init__(np.zeros(0, dtype=np.int16), gain, startFrame, info)
+        self.chunks = iter(chunks)
+        self.ahead = ahead
+        self.ready = deque() # rendered chunks that weren't played yet
+        self.exhausted = False # chunks has nothing left
+        self.renderLock = threading.Lock() # chunks is only ever advanced by one thread at a time
+        self.finished = False
+        self.nextChunk() # the first chunk is rendered by whoever starts the voice, so it can play right away
+
+    def renderChunk(self):
+        # renders one more chunk if there is one, the caller holds self.renderLock
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.exhausted = True
+        else:
+            self.ready.append(chunk)
+
+    def renderAhead(self):
+        """
+            ## renderAhead()
+            renders chunks until self.ahead of them are waiting, a chunk at a time so the sink's thread never waits on more than one.
+        """
+        while not self.exhausted and not self.finished and len(self.ready) < self.ahead:
+            with self.renderLock:
+                if not self.exhausted:
+                    self.renderChunk()
+
+    def nextChunk(self):
+        if len(self.ready) == 0 and not self.exhausted: # the feeder didn't get to it in time
+            with self.renderLock:
+                if len(self.ready) == 0 and not self.exhausted:
+                    self.renderChunk()
+        self.cursor = 0
+        if len(self.ready) > 0:
+            self.buffer = self.ready.popleft()
+        else:
+            self.buffer = np.zeros(0, dtype=np.int16)
+            self.finished = True
+
+    def read(self, row : np.array):
+        written = 0
+        while written < len(row) and not self.finished:
+            chunk = self.buffer[self.cursor:self.cursor + len(row) - written]
+            np.multiply(chunk, self.gain, out=row[written:written + len(chunk)], casting="unsafe")
+            written += len(chunk)
+            self.cursor += len(chunk)
+            if self.cursor >= len(self.buffer):
+                self.nextChunk()
+        row[written:] = 0
+
+    def skip(self, frames : int):
+        self.read(np.zeros(frames, dtype=np.int32))
+
+    def isDone(self):
+        return self.finished
+
+class OutputTap:
+    def __init__(self, capacity : int = 16384, samplingRate : int = 44100, peakHalfLife : float = .25):
+        """
+            ## OutputTap
+            ring buffer of the last capacity frames of the mix, written by the mixer's thread after every block (see Mixer.addTap()).
+            The ring is stored twice in a row, so the latest frames are always one contiguous slice and getLatest() can return a view instead of a copy.
+            Views aren't locked, a frame can be overwritten while it is being read, which is fine for drawing.
+
+            ### capacity : int
+            the most frames that can be read back at once
+
+            ### peakHalfLife : float
+            seconds the running peak takes to fall by half once the mix gets quieter
+        """
+        self.capacity = capacity
+        self.samplingRate = samplingRate
+        self.buffer = np.zeros(2 * capacity, dtype=np.int16)
+        self.written = 0 # total frames ever written
+        self.peak = 0.0
+        self.peakHalfLifeFrames = peakHalfLife * samplingRate
+
+    def write(self, block : np.array):
+        frames = min(len(block), self.capacity)
+        block = block[len(block) - frames:]
+        start = self.written % self.capacity
+
+        # the first copy, wrapping around the end of the ring
+        firstFrames = min(frames, self.capacity - start)
+        self.buffer[start:start + firstFrames] = block[:firstFrames]
+        self.buffer[:frames - firstFrames] = block[firstFrames:]
+        # the second copy, straight after the first one
+        self.buffer[self.capacity + start:self.capacity + start + firstFrames] = block[:firstFrames]
+        self.buffer[self.capacity:self.capacity + frames - firstFrames] = block[firstFrames:]
+
+        blockPeak = max(abs(int(block.max())), abs(int(block.min()))) if frames > 0 else 0
+        self.peak = max(blockPeak, self.peak * 0.5 ** (frames / self.peakHalfLifeFrames))
+        self.written += frames
+
+    def getLatest(self, frames : int, delayFrames : int = 0):
+        """
+            ## getLatest()
+            returns a view of the frames that ended delayFrames ago, frames + delayFrames can be at most capacity. Frames from before anything was written are silent.
+        """
+        frames = min(frames, self.capacity - delayFrames)
+        end = (self.written - delayFrames) % self.capacity + self.capacity
+        return self.buffer[end - frames:end]
+
+    def getPeak(self):
+        return self.peak
+
+    def isSilent(self):
+        return self.peak < 1
+
+class Mixer:
+    def __init__(self,
+                 samplingRate : int = 44100,
+                 blockSize : int = 1024,
+                 polyphony : int = 64,
+                 sink = None):
+        """
+            ## Mixer
+            mixes every playing voice into fixed size stereo int16 blocks. The sink asks for blocks through callback() whenever it needs more audio.
+
+            ### samplingRate : int
+            frames per second
+
+            ### blockSize : int
+            frames per rendered block
+
+            ### polyphony : int
+            the max amount of voices playing at once, past that the quietest and oldest voice gets stolen
+
+            ### sink
+            where the blocks go (PygameSink, WaveFileSink or NullSink), a NullSink if None
+        """
+        self.samplingRate = samplingRate
+        self.blockSize = blockSize
+        self.polyphony = polyphony
+        self.sink = sink if sink is not None else NullSink(samplingRate)
+
+        self.voices = []
+        self.lock = threading.Lock() # voices are added from the MIDI thread while the sink thread renders
+        self.mixBuffer = np.zeros((polyphony, blockSize), dtype=np.int32) # one row per voice, summed in one go
+        self.sumBuffer = np.zeros(blockSize, dtype=np.int32)
+
+        self.taps = [] # OutputTaps (or anything with a write()) that get every mixed block, see addTap()
+        self.listeners = [] # told about every voice that starts or stops and every mixed block, see addListener()
+        self.started = 0 # total voices ever started
+
+        self.frame = 0 # total frames rendered so far
+        self.renderSeconds = 0
+        self.steals = 0
+
+        self.thread = None
+        self.feedThread = None # renders StreamVoices ahead, see feed()
+        self.stopEvent = threading.Event()
+        self.feedEvent = threading.Event()
+
+    #VOICES
+    def addVoice(self, buffer : np.array, gain : float = 1, info : dict = None):
+        """
+            ## addVoice()
+            starts playing a mono int16 buffer on the next block. If every voice is taken the quietest, oldest one is stolen.
+        """
+        return self.startVoice(MixerVoice(buffer, gain, self.frame, info))
+
+    def addStream(self, chunks, gain : float = 1, info : dict = None):
+        """
+            ## addStream()
+            same as addVoice() but for a voice that is rendered in chunks as it plays.
+        """
+        voice = self.startVoice(StreamVoice(chunks, gain, self.frame, info))
+        self.feedEvent.set()
+        return voice
+
+    def startVoice(self, voice : MixerVoice):
+        with self.lock:
+            if len(self.voices) >= self.polyphony:
+                stolen = self.getStealCandidate()
+                self.voices = [other for other in self.voices if other is not stolen]
+                self.steals += 1
+                for listener in self.listeners:
+                    listener.voiceStopped(stolen, self.frame)
+            # the first frame of the voice is the first frame of the next block, which always starts at self.frame since it only changes under the lock
+            voice.startFrame = self.frame
+            voice.number = self.started
+            self.started += 1
+            self.voices = self.voices + [voice] # a new list, callback() mixes the one it took without the lock
+            for listener in self.listeners:
+                listener.voiceStarted(voice, self.frame)
+        return voice
+
+    def removeVoice(self, voice : MixerVoice):
+        with self.lock:
+            if voice in self.voices:
+                self.voices = [other for other in self.voices if other is not voice]
+                for listener in self.listeners:
+                    listener.voiceStopped(voice, self.frame)
+
+    def getStealCandidate(self):
+        """
+            ## getStealCandidate()
+            the voice that will be missed the least. Voices are ranked by their upcoming amplitude divided by their age in seconds, so a quiet tail of an old note goes before a loud new one.
+        """
+        def priority(voice : MixerVoice):
+            age = (self.frame - voice.startFrame) / self.samplingRate
+            return voice.getLevel(self.blockSize) / (1 + age)
+
+        return min(self.voices, key=priority)
+
+    def addTap(self, tap):
+        """
+            ## addTap()
+            gives tap.write() every block of the mix (the mono int16 left channel) right after it is rendered, on the sink's thread, so it has to be quick.
+        """
+        self.taps.append(tap)
+        return tap
+
+    def addListener(self, listener):
+        """
+            ## addListener()
+            from the next block on, calls listener.voiceStarted(voice, frame) and listener.voiceStopped(voice, frame) whenever a voice is started or stopped
+            before it ended (removed or stolen), and listener.blockMixed(block, frame) with every mixed block (the mono int16 left channel) on the sink's thread.
+            frame is the mixer frame the voice starts or stops at or the block starts at. The first two are called while the mixer is locked, so all three have to be quick.
+            Voices that are already playing are passed to voiceStarted() right away, frame - voice.startFrame is how far into them the mix is.
+            Returns the frame the listener starts at.
+        """
+        with self.lock:
+            self.listeners = self.listeners + [listener] # the sink thread keeps using the old list until its next block
+            for voice in self.voices:
+                listener.voiceStarted(voice, self.frame)
+            return self.frame
+
+    def removeListener(self, listener):
+        """
+            ## removeListener()
+            stops calling listener, returns the frame it stopped at. The block right before that frame can still be on its way to blockMixed().
+        """
+        with self.lock:
+            self.listeners = [other for other in self.listeners if other is not listener]
+            return self.frame
+
+    def getActiveVoices(self):
+        return len(self.voices)
+
+    #RENDERING
+    def callback(self, out : np.array):
+        """
+            ## callback()
+            renders the next block into out, a (blockSize, 2) int16 array. Called by the sink every time it needs more audio.
+        """
+        start = time.perf_counter()
+
+        # the lock is only held to take the block's voices, so starting a voice never waits on the mixing
+        with self.lock:
+            voices = self.voices
+            blockFrame = self.frame
+            self.frame += self.blockSize # voices started or stopped from now on start or stop on the next block
+            listeners = self.listeners
+
+        for i, voice in enumerate(voices):
+            voice.read(self.mixBuffer[i])
+        if any(voice.isDone() for voice in voices):
+            with self.lock:
+                self.voices = [voice for voice in self.voices if not voice.isDone()]
+
+        np.sum(self.mixBuffer[:len(voices)], axis=0, out=self.sumBuffer)
+        np.clip(self.sumBuffer, -32768, 32767, out=self.sumBuffer) # the voices can add up past what 16 bits can hold
+        out[:, 0] = self.sumBuffer
+        out[:, 1] = self.sumBuffer
+        for tap in self.taps:
+            tap.write(out[:, 0])
+        for listener in listeners:
+            listener.blockMixed(out[:, 0], blockFrame)
+
+        elapsed = time.perf_counter() - start
+        self.renderSeconds += elapsed
+        if PROFILER.enabled:
+            PROFILER.record("mix", start, elapsed)
+        return out
+
+    def makeBlock(self):
+        return np.zeros((self.blockSize, 2), dtype=np.int16)
+
+    def renderFrames(self, frames : int):
+        """
+            ## renderFrames()
+            renders at least frames frames straight into the sink without a thread, for rendering to a file or testing.
+        """
+        block = self.makeBlock()
+        for _ in range(0, frames, self.blockSize):
+            self.sink.write(self.callback(block))
+
+    #THREAD
+    def start(self):
+        if self.thread is not None:
+            return
+        self.stopEvent.clear()
+        self.thread = threading.Thread(target=self.sink.run, args=(self, self.stopEvent))
+        self.thread.daemon = True
+        self.thread.start()
+        self.feedThread = threading.Thread(target=self.feed)
+        self.feedThread.daemon = True
+        self.feedThread.start()
+        atexit.register(self.stop) # runs before pygame's own exit handler, so the sink thread isn't left using a closed mixer
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.stopEvent.set()
+        self.feedEvent.set()
+        self.thread.join()
+        self.feedThread.join()
+        self.thread = None
+        self.feedThread = None
+        self.sink.close()
+
+    def feed(self):
+        """
+            ## feed()
+            runs on its own thread while the mixer is started, keeping every playing StreamVoice self.ahead chunks ahead of the mix so the chunks aren't
+            synthesized on the sink's thread. Checks twice a block, and right away when a stream is added.
+        """
+        interval = self.blockSize / self.samplingRate / 2
+        while not self.stopEvent.is_set():
+            self.feedEvent.wait(interval)
+            self.feedEvent.clear()
+            with self.lock:
+                streams = [voice for voice in self.voices if isinstance(voice, StreamVoice)]
+            for voice in streams:
+                voice.renderAhead()
+
+    def getStats(self):
+        seconds = self.frame / self.samplingRate
+        return {
+            "activeVoices" : len(self.voices),
+            "framesRendered" : self.frame,
+            "steals" : self.steals,
+            "underruns" : self.sink.underruns,
+            "realtime" : seconds / self.renderSeconds if self.renderSeconds > 0 else 0, # how many times faster than realtime the mixing is
+        }
+
+class NullSink:
+    def __init__(self, samplingRate : int = 44100, realtime : bool = False):
+        """
+            ## NullSink
+            throws the blocks away. With realtime it asks for blocks at the speed a sound card would, counting an underrun every time a block is ready after it was due.
+        """
+        self.samplingRate = samplingRate
+        self.realtime = realtime
+        self.framesWritten = 0
+        self.underruns = 0
+
+    def write(self, block : np.array):
+        self.framesWritten += len(block)
+
+    def run(self, mixer : Mixer, stopEvent : threading.Event):
+        block = mixer.makeBlock()
+        blockSeconds = mixer.blockSize / self.samplingRate
+        deadline = time.perf_counter() + blockSeconds
+
+        while not stopEvent.is_set():
+            self.write(mixer.callback(block))
+            if not self.realtime:
+                continue
+
+            now = time.perf_counter()
+            if now > deadline:
+                self.underruns += 1
+                deadline = now # start over instead of trying to catch up
+            else:
+                time.sleep(deadline - now)
+            deadline += blockSeconds
+
+    def close(self):
+        pass
+
+class WaveFileSink(NullSink):
+    def __init__(self, path : str, samplingRate : int = 44100, realtime : bool = False):
+        """
+            ## WaveFileSink
+            writes the blocks to a 16 bit stereo WAV file as they are rendered.
+        """
+        super().__init__(samplingRate, realtime)
+        self.file = wave.open(path, "wb")
+        self.file.setnchannels(2)
+        self.file.setsampwidth(2)
+        self.file.setframerate(samplingRate)
+
+    def write(self, block : np.array):
+        super().write(block)
+        self.file.writeframes(block.tobytes())
+
+    def close(self):
+        self.file.close()
+
+class PygameSink:
+    def __init__(self, channel : int = 0):
+        """
+            ## PygameSink
+            plays the blocks through one pygame.mixer.Channel, queueing the next block while the current one is playing.
+            pygame.mixer has to be initialized as 16 bit stereo at the mixer's sampling rate.
+
+            ### channel : int
+            the pygame channel to play on
+        """
+        self.channel = channel
+        self.underruns = 0
+
+    def write(self, block : np.array):
+        import pygame # only needed when actually playing through the speakers
+        pygame.mixer.Channel(self.channel).queue(pygame.sndarray.make_sound(block))
+
+    def run(self, mixer : Mixer, stopEvent : threading.Event):
+        import pygame
+        channel = pygame.mixer.Channel(self.channel)
+        block = mixer.makeBlock()
+        blockSeconds = mixer.blockSize / mixer.samplingRate
+        started = False
+
+        while not stopEvent.is_set():
+            if channel.get_queue() is not None: # the next block is already waiting
+                time.sleep(blockSeconds / 4)
+                continue
+
+            if started and not channel.get_busy(): # the channel ran out of audio before the next block was there
+                self.underruns += 1
+            sound = pygame.sndarray.make_sound(mixer.callback(block))
+            if channel.get_busy():
+                channel.queue(sound)
+            else:
+                channel.play(sound)
+            started = True
+
+    def close(self):
+        pass
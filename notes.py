@@ -1,18 +1,29 @@
+from __future__ import annotations # keeps the pygame annotations from loading pygame
+import os
 import numpy as np
-import pygame
 import math
 import globals as gb
+from globals import pygame
 import time
 import random
-import mido
 import threading
 from text import Text
+from cache import SoundCache, fingerprint
+from synthesis import getEngine, makeHarmonics, renderNoteInto, renderNotesInto, streamNote, StringEngine
+from mixer import Mixer, PygameSink, OutputTap
+from midi import MidiIngest, LatencyTracker
+from overview import WaveOverview
+from bank import BankManager
+from voices import Voice, VoiceRing
+from resynthesis import SynthWorker
+from profiler import PROFILER
+from recorder import SessionRecorder
+from render import SUSTAIN_MULT
 from frequencies import freqList as fq
 
 #Mwroc Camp
 
-pygame.init()
-pygame.mixer.init()
+mido = gb.LazyModule("mido") # only loaded once a MIDI device is opened
 
 class Note:
     def __init__(self, 
@@ -24,7 +35,9 @@ class Note:
                  lineEndColor : tuple = (50, 255, 0),
                  circleColor : tuple = (255, 255, 255),
                  drawMode : str = "Lines",
-                 inputMethod : str = "Laptop"):
+                 inputMethod : str = "Laptop",
+                 synthMode : str = "Recurrence",
+                 outputMode : str = "Channels"):
         
         self.samplingRate = samplingRate
         self.frequency = frequency
@@ -35,23 +48,64 @@ class Note:
         self.circleColor = circleColor
         self.drawMode = drawMode
         self.inputMethod = inputMethod
+        self.synthMode = synthMode
+        self.engineParameters = self.getEngineParameters()
+        self.engine = getEngine(synthMode, **self.engineParameters) # the synthesis engine used by makeSound
         self.currentChannel = 0
         self.channelMax = 64
 
+        self.outputMode = outputMode # "Channels" plays every note on its own pygame channel, "Mixer" mixes them in self.mixer
+        self.mixer = None
+        self.mixerVoice = None # the voice started by playSound
+        self.streamStop = None # ends the stream playSound started on a pygame channel, see streamSound()
+        self.scope = None # the last frames of the mix, drawn by drawMovingWave instead of the last voice
+        self.scopeFrames = 2048 # frames of the mix shown at once
+        self.recorder = None # SessionRecorder of the mix while recording, see startRecording()
+        self.recordingStatus = None # what the last startRecording() or stopRecording() did, shown with the rest of getData()
+        if outputMode == "Mixer":
+            pygame.load() # the sink plays through pygame.mixer, which has to be initialized first
+            self.mixer = Mixer(samplingRate, polyphony=self.channelMax, sink=PygameSink())
+            self.scope = self.mixer.addTap(OutputTap(samplingRate=samplingRate))
+            self.mixer.start()
+        elif outputMode != "Channels":
+            raise NameError(f"outputMode ({outputMode}) is not a valid output mode.")
+
         self.mult = 1
+        self.streamDuration = 2 # notes longer than this many seconds are streamed in chunks instead of being rendered all at once
+        self.bank = None # BankManager of pre-rendered samples, see useSampleBank()
+        self.latency = LatencyTracker() # time from a MIDI note arriving to it being synthesized ("synthesis") and played ("play")
 
         self.frames = int(self.duration * self.samplingRate)
         self.sound = None
         self.wave = None
         self.defaultWave = None
-        self.startTime = None
+        self.soundCache = SoundCache()
+        self.synthWorker = SynthWorker(self.renderSound) # renders the sounds asked for by requestSound(), started by the first one
+        self.requestedKey = None # the sound the worker is making, None once it was swapped in
+        self.previewDuration = .3 # seconds of a requested sound that are rendered right away
+        self.overview = None # min/max pyramid of self.wave, see getOverview()
+        self.staticSurface = None # cached background, full wave and text, see updateStaticLayer()
+        self.staticKey = None
+        self.staticWave = None
+        self.movingWaveDrawn = False
+        self.voice = None # the voice drawn by drawMovingWave, only ever set by the main thread, see setVoice()
+        self.voicePeak = 1
+        self.voices = VoiceRing() # voices played by the MIDI thread, picked up by the main thread in adoptVoices()
+        self.voicePosition = 0
+        self.resetRequested = threading.Event() # set by the MIDI thread, the reset itself is done by the main thread
+        self.lastDrawnIndex = 0
         self.text = Text((10, 10), True)
+        self.profilerText = Text() # the profiler overlay, see drawProfiler()
+        self.profilerRect = None # where the overlay was last drawn
+        self.profilerRefresh = .25 # seconds between overlay updates, so the numbers can be read
+        self.profilerUpdated = 0
         self.controllerState = "Weight"
 
+        # the keys are the names of the pygame key constants, looked up in userInput() so that making a Note doesn't load pygame
         self.stateSettings = [
-            ["Frequency", pygame.K_f, 1.1, "*"],
-            ["Duration", pygame.K_d, 1.1, "*"],
-            ["Strength", pygame.K_s, .1, "+"],
+            ["Frequency", "K_f", 1.1, "*"],
+            ["Duration", "K_d", 1.1, "*"],
+            ["Strength", "K_s", .1, "+"],
         ]
 
         self.drawModes = [
@@ -68,6 +122,52 @@ class Note:
         self.baseValues = [[self.stateSettings[i][0], getattr(self, gb.cammelCase(self.stateSettings[i][0]))] for i in range(len(self.stateSettings))]
 
     #SOUND
+    def getSoundKey(self, frequency : float, duration : float, strength : float, engine = None, harmonics : list = None):
+        """
+            ## getSoundKey()
+            returns the key that identifies a synthesized sound in self.soundCache. Anything that changes the generated wave has to be part of it.
+            engine and harmonics default to self.engine and self.getHarmonics(), they are given by callers that render on another thread so the key matches what they render with.
+        """
+        engine = self.engine if engine == None else engine
+        return (frequency, duration, strength, self.getHarmonicsKey(harmonics), self.samplingRate, engine.getKey())
+
+    def getEngineParameters(self):
+        return {} # a plain Note uses the engine's defaults
+
+    def updateEngine(self):
+        """
+            ## updateEngine()
+            makes a new engine when getEngineParameters() changed. Engines are never changed in place, a render that is still running keeps the one it started with.
+        """
+        parameters = self.getEngineParameters()
+        if parameters != self.engineParameters:
+            self.engineParameters = parameters
+            self.engine = getEngine(self.synthMode, **parameters)
+
+    def getHarmonics(self):
+        return [1] # a plain Note is a single cosine
+
+    def getHarmonicsKey(self, harmonics : list = None):
+        return None
+
+    def renderSound(self, key, engine, frequency : float, duration : float, strength : float, harmonics : list):
+        """
+            ## renderSound()
+            returns the (wave, sound) pair of a note, from the sound cache if it was already made. Doesn't set any attributes, so it is also run by self.synthWorker.
+        """
+        cached = self.soundCache.get(key)
+        if cached != None: # the same note was already made, no need to synthesize it again
+            return cached
+
+        # the note is rendered straight into the Sound's own stereo buffer, the wave is a view of its left channel
+        with PROFILER.scope("synthesis"):
+            sound = pygame.mixer.Sound(buffer=bytes(int(duration * self.samplingRate) * 4))
+            samples = pygame.sndarray.samples(sound)
+            renderNoteInto(engine, samples, frequency, strength, harmonics, self.samplingRate)
+            wave = samples[:, 0]
+        self.soundCache.put(key, wave, sound)
+        return wave, sound
+
     def makeSound(self, frequency : float = None):
         """
             ## makeSound()
@@ -75,55 +175,258 @@ class Note:
         """
 
         self.frames = int(self.duration * self.samplingRate) # total instances to account for
+        self.updateEngine()
 
         if frequency == None:
             frequency = self.getFrequency()
         else:
             self.frequency = frequency
-        rawWave = np.cos(2 * np.pi * frequency * np.linspace(0, self.duration, self.frames)) * (self.strength if self.strength <= 1 else 1) # raw waveform
-        rawWave *= np.concatenate((np.linspace(0, 1, 100), np.linspace(1, 0, self.frames - 100))) # basic linear fade
 
-        self.wave = rawWave # sets self.wave to the actual generated wave
-        self.wave = (32768 * self.wave).astype(np.int16) # maps the wave to audio min max of a 16 bit int (32768)
+        key = self.getSoundKey(frequency, self.duration, self.strength)
+        self.wave, self.sound = self.renderSound(key, self.engine, frequency, self.duration, self.strength, self.getHarmonics())
+        self.requestedKey = None # anything the worker is still making is out of date now
 
-        stereoWave = np.asarray([self.wave, self.wave]).T # creates an array that is transposed along the y axis, self.wave is only one channel whereas this is stereo (two channels)
-        self.sound = pygame.sndarray.make_sound(stereoWave.copy())
+    def requestSound(self):
+        """
+            ## requestSound()
+            makeSound() for edits made on the main thread. The sound is rendered by self.synthWorker and swapped in by adoptSound() when it is done, until then
+            self.wave only holds the first self.previewDuration seconds of it (and self.sound is None). Requests made while the worker is busy replace each other.
+        """
+        self.frames = int(self.duration * self.samplingRate)
+        self.updateEngine()
+        frequency = self.getFrequency()
+        key = self.getSoundKey(frequency, self.duration, self.strength)
+        cached = self.soundCache.get(key)
+        if cached != None:
+            self.wave, self.sound = cached
+            self.requestedKey = None
+            return
+
+        # the preview is the real start of the note, the rest of it is silent until the full sound is ready
+        with PROFILER.scope("preview"):
+            preview = np.zeros(self.frames, dtype=np.int16)
+            chunks = streamNote(self.engine, frequency, self.duration, self.strength, self.getHarmonics(), self.samplingRate, max(1, int(self.previewDuration * self.samplingRate)))
+            first = next(chunks, None)
+            chunks.close()
+            if first is not None:
+                preview[:len(first)] = first
+        self.wave, self.sound = preview, None
+
+        self.requestedKey = key
+        self.synthWorker.start().request(key, key, self.engine, frequency, self.duration, self.strength, self.getHarmonics())
+
+    def adoptSound(self):
+        """
+            ## adoptSound()
+            swaps in the sound self.synthWorker finished if it is still the one that was asked for last. If the worker's render failed the sound is made right here instead.
+        """
+        result = self.synthWorker.getResult()
+        if result == None or result[0] != self.requestedKey:
+            return
+        if isinstance(result[1], Exception):
+            self.requestedKey = None
+            self.makeSound()
+            return
+        self.wave, self.sound = result[1]
+        self.frames = len(self.wave)
+        self.requestedKey = None
+
+    def waveToSound(self, wave : np.array):
+        stereoWave = np.asarray([wave, wave]).T # creates an array that is transposed along the y axis, wave is only one channel whereas this is stereo (two channels)
+        return pygame.sndarray.make_sound(stereoWave.copy())
+
+    def makeSounds(self, notes : list):
+        """
+            ## makeSounds()
+            makes the sounds for several notes at once (like a chord) and returns a (wave, sound) pair for each of them. Unlike makeSound() it doesn't set any attributes,
+            so it can be called from the MIDI thread while the main thread is drawing. Notes that aren't cached are all rendered in one engine call, straight into
+            what plays them: a mono wave for the mixer (sound is None, the mixer never plays it) or the stereo buffer of a pygame Sound like renderSound().
+
+            ### notes : list
+            a (frequency, duration, strength) tuple for every note
+        """
+        sounds = [None] * len(notes)
+        missing = [] # indexes of the notes that have to be synthesized
+        # the main thread can swap in a new engine or new harmonics at any time, both are read once so the keys match what is rendered
+        engine = self.engine
+        harmonics = list(self.getHarmonics())
+        keys = [self.getSoundKey(*note, engine, harmonics) for note in notes]
+
+        for i, key in enumerate(keys):
+            sounds[i] = self.soundCache.get(key)
+            if sounds[i] is None:
+                missing.append(i)
+
+        if len(missing) > 0:
+            with PROFILER.scope("synthesis"):
+                frequencies, durations, strengths = zip(*[notes[i] for i in missing])
+                outs = []
+                for i, duration in zip(missing, durations):
+                    frames = int(duration * self.samplingRate)
+                    if self.mixer != None:
+                        sounds[i] = (np.empty(frames, dtype=np.int16), None)
+                        outs.append(sounds[i][0])
+                    else:
+                        sound = pygame.mixer.Sound(buffer=bytes(frames * 4))
+                        samples = pygame.sndarray.samples(sound)
+                        sounds[i] = (samples[:, 0], sound)
+                        outs.append(samples)
+                renderNotesInto(engine, outs, frequencies, strengths, harmonics, self.samplingRate)
+                for i in missing:
+                    self.soundCache.put(keys[i], *sounds[i])
+
+        return sounds
 
     def getFrequency(self):
         return self.frequency
 
+    def playWave(self, wave : np.array = None, sound = None, info : dict = None):
+        """
+            ## playWave()
+            plays a sound on top of anything else that is playing, either through the mixer or on the next pygame channel. Plays the last made sound if wave and sound aren't given.
+            info describes the note for the recorder (see mixer.MixerVoice).
+        """
+        if wave is None:
+            wave, sound = self.wave, self.sound
+
+        if self.mixer != None:
+            return self.mixer.addVoice(wave, info=info)
+
+        pygame.mixer.Channel(self.currentChannel).play(sound)
+        self.currentChannel += 1
+        if self.currentChannel == self.channelMax:
+            self.currentChannel = 0
+
+    def playSample(self, wave : np.array, gain : float = 1, info : dict = None):
+        """
+            ## playSample()
+            plays a pre-rendered sample (from the sample bank) at gain, straight from the array it is given (often its memory map) when going through the mixer.
+        """
+        if self.mixer != None:
+            return self.mixer.addVoice(wave, gain, info)
+        self.playWave(wave, self.waveToSound(np.clip(wave * gain, -32768, 32767).astype(np.int16)))
+
+    def useSampleBank(self, root : str, processes : int = None):
+        """
+            ## useSampleBank()
+            plays MIDI notes from a bank of pre-rendered samples kept in root instead of synthesizing them. The bank for the current harmonics is built in the background
+            if it isn't there yet (and again once the harmonics stop changing), notes are synthesized as usual until it is ready. Banks of old harmonics are deleted, see bank.BankManager.
+        """
+        self.bank = BankManager(root, self.synthMode, self.samplingRate, processes)
+        self.bank.setHarmonics(self.getHarmonics())
+
+    def streamSound(self, frequency : float, duration : float = None, strength : float = None, info : dict = None):
+        """
+            ## streamSound()
+            plays a note while it is being rendered, a chunk at a time, so long notes start right away and don't have to fit in memory.
+            Doesn't touch self.wave or self.sound, so the last made sound is still what gets drawn. duration and strength default to self.duration and self.strength.
+            Returns the mixer's voice, or without the mixer a threading.Event that stops the stream when it is set.
+        """
+        duration = self.duration if duration == None else duration
+        strength = self.strength if strength == None else strength
+        engine, parameters, harmonics = self.engine, self.engineParameters, self.getHarmonics()
+        chunkFrames = 4096
+        chunks = streamNote(engine, frequency, duration, strength, harmonics, self.samplingRate, chunkFrames)
+        if self.mixer != None:
+            # everything recorder.replaySession() needs to render the note again
+            info = dict(info or {}, frequency=frequency, duration=duration, strength=strength, synthMode=self.synthMode, engineParameters=parameters,
+                        harmonics=harmonics, samplingRate=self.samplingRate, chunkFrames=chunkFrames)
+            return self.mixer.addStream(chunks, info=info)
+
+        stop = threading.Event()
+        def queueChunks(channel):
+            # queues the next chunk whenever the channel is done with the last one
+            for chunk in chunks:
+                while channel.get_queue() != None and not stop.is_set():
+                    time.sleep(.005)
+                if stop.is_set():
+                    channel.stop()
+                    chunks.close()
+                    return
+                sound = pygame.sndarray.make_sound(np.asarray([chunk, chunk]).T.copy())
+                if channel.get_busy():
+                    channel.queue(sound)
+                else:
+                    channel.play(sound)
+
+        streamThread = threading.Thread(target=queueChunks, args=(pygame.mixer.Channel(self.currentChannel),))
+        streamThread.daemon = True
+        streamThread.start()
+        self.currentChannel += 1
+        if self.currentChannel == self.channelMax:
+            self.currentChannel = 0
+        return stop
+
     def playSound(self):
         #if the sound exists, then instead of stacking another sound into the played audio, it stops and only plays the one sound.
-        if self.sound != None:
-            self.sound.stop()
+        if self.mixer != None:
+            if self.mixerVoice != None:
+                self.mixer.removeVoice(self.mixerVoice)
+        else:
+            if self.voice != None and self.voice.sound != None:
+                self.voice.sound.stop()
+            if self.streamStop != None:
+                self.streamStop.set()
+                self.streamStop = None
+
+        # long notes that aren't made yet are streamed like sustained MIDI notes, so they start right away instead of after the whole note is synthesized
+        self.updateEngine()
+        frequency = self.getFrequency()
+        info = {"frequency" : frequency, "duration" : self.duration, "strength" : self.strength}
+        if self.recorder != None:
+            self.recorder.logEvent("play", sustain=self.mult, **info)
+        if self.duration > self.streamDuration and self.getSoundKey(frequency, self.duration, self.strength) not in self.soundCache:
+            stream = self.streamSound(frequency, info=info)
+            if self.mixer != None:
+                self.mixerVoice = stream
+            else:
+                self.streamStop = stream
+            self.setVoice(Voice(frequency, None, self.strength, self.duration, time.time())) # nothing to draw, the same as a streamed MIDI note
+            return
 
         #makes and plays the sound.
         self.makeSound()
-        self.sound.play()
+        if self.mixer != None:
+            self.mixerVoice = self.playWave(info=info)
+        else:
+            self.sound.play()
         
         #updates relevant rendering variables
-        self.startTime = time.time()
-        self.lastDrawnIndex = 0
+        self.setVoice(Voice(self.getFrequency(), None, self.strength, self.duration, time.time(), self.wave, self.sound))
 
     #WAVE GRAPHICS
+    def getOverview(self):
+        """
+            ## getOverview
+            returns the WaveOverview of self.wave, only building a new one when the wave is a different one than last time.
+        """
+        wave = self.wave
+        if self.overview == None or self.overview.wave is not wave:
+            self.overview = WaveOverview(wave)
+        return self.overview
+
     def drawFullWave(self, screen : pygame.display):
         """
             ## drawFullWave
-            draws the sound wave being played all at once to the screen. The waveform's resolution is durastically reduced for performace reasons.
+            draws the sound wave being played all at once to the screen. Every pixel column shows the min and max of the frames it covers (read from the wave's overview),
+            so peaks are never skipped no matter how small the window is.
 
             ### screen : pygame.display
             the screen to draw to
         """
-        if self.sound == None: # doesn't draw if there isn't a sound hasn't been played yet
+        if self.wave is None: # doesn't draw if a sound hasn't been made yet
             return
 
         screenSize = pygame.math.Vector2(pygame.display.get_window_size()) # for scaling purposes
         offset = screenSize.y/6 # Normalizes offsets to relative screen size
-        reducedWave = self.wave[::int(math.ceil(self.frames/(screenSize.x/1)))] # Reduce the amount of drawn instances to the width of the screen in pixels
+        overview = self.getOverview()
+        mins, maxs = overview.getRange(screenSize.x) # one min and max per pixel
 
-        normalizedWave = reducedWave / np.max(np.abs(reducedWave)) * offset # Normalizes the min and max values of the wave (visually) to that of 1x the offset scale.
+        # zigzags between the min and the max of each column so the line fills the wave's outline
+        reducedWave = np.column_stack((mins, maxs)).ravel()
+        normalizedWave = reducedWave / max(overview.peak, 1) * offset # Normalizes the min and max values of the wave (visually) to that of 1x the offset scale.
         #relative positioning lists for each instance
-        x = np.linspace(0, screenSize.x, len(reducedWave))
+        x = np.repeat(np.linspace(0, screenSize.x, len(mins)), 2)
         y = screenSize.y - (offset * 3) + normalizedWave
 
         self.drawArray(x, y, screen)
@@ -131,7 +434,8 @@ class Note:
     def drawMovingWave(self, screen : pygame.display):
         """
             ## drawMovingWave
-            draws the sound wave being played for each chunk of sound that was played over the time that it took to render the last frame.
+            draws the sound wave being played for each chunk of sound that was played over the time that it took to render the last frame. Returns whether anything was drawn.
+            With the mixer the last frames of the actual mix are drawn instead, see drawScope().
 
             ### screen : pygame.display
             the screen to draw to
@@ -139,32 +443,82 @@ class Note:
         screenSize = pygame.math.Vector2(pygame.display.get_window_size()) #for scaling purposes
         offset = screenSize.y/6 # Normalizes offsets to relative screen size
 
+        if self.scope != None:
+            return self.drawScope(screen, screenSize, offset)
+
         #if the audio isn't being played then it shouldn't render.
-        if self.startTime == None:
-            return
+        voice = self.voice
+        if voice == None or voice.wave is None:
+            return False
+        frames = voice.getFrames()
         
-        elapsedTime = time.time() - self.startTime
-        if elapsedTime > self.duration: # prevents calling from a range that isn't there and limits to only the frames within the duration.
-            elapsedTime = self.duration
+        elapsedTime = time.time() - voice.startTime
+        if elapsedTime > voice.duration: # prevents calling from a range that isn't there and limits to only the frames within the duration.
+            elapsedTime = voice.duration
 
-        # determines the relative end frame and relative start frame based on the time that has passed. It also detemines the current frame within the sequence of self.frames (not actual frames, instead wave indexes)
-        currentFrame = int((elapsedTime / self.duration) * self.frames)
+        # determines the relative end frame and relative start frame based on the time that has passed. It also detemines the current frame within the sequence of frames (not actual frames, instead wave indexes)
+        currentFrame = int((elapsedTime / voice.duration) * frames)
         relStartFrame = max(self.lastDrawnIndex, currentFrame - int(self.samplingRate * elapsedTime))
-        relEndFrame = min(self.frames, currentFrame + int(self.samplingRate * elapsedTime))
+        relEndFrame = min(frames, currentFrame + int(self.samplingRate * elapsedTime))
 
         if relEndFrame - relStartFrame <= 0: #this equation would return a negative value occasionally when editing values, so it returns if that is the case.
-            return
+            return False
 
         #normalizes the wave size to that -1, 1. Then multiplies by the offset value to be evenly spaced.
-        normalizedWave = self.wave[relStartFrame:relEndFrame] / np.max(np.abs(self.wave)) * offset
+        normalizedWave = voice.wave[relStartFrame:relEndFrame] / self.voicePeak * offset
         #gets the x and y lists for rendering
         x = np.linspace(0, screenSize.x, relEndFrame - relStartFrame)
         y = screenSize.y - offset + normalizedWave
 
-        self.drawArray(x, y, screen, startPercent=relStartFrame/self.frames, endPercent=relEndFrame/self.frames)
+        self.drawArray(x, y, screen, startPercent=relStartFrame/frames, endPercent=relEndFrame/frames)
 
         #updates the last drawn index
         self.lastDrawnIndex = relEndFrame
+        return True
+
+    def drawScope(self, screen, screenSize : pygame.Vector2, offset : float):
+        """
+            ## drawScope
+            draws the last self.scopeFrames frames of the mix, what is coming out of the speakers with every voice in it. The frames are read from self.scope
+            one block late, the block the sink has queued, and scaled by the running peak of the mix. Returns whether anything was drawn.
+        """
+        if self.scope.isSilent():
+            return False
+
+        window = self.scope.getLatest(self.scopeFrames, self.mixer.blockSize)
+        x = np.linspace(0, screenSize.x, len(window))
+        y = screenSize.y - offset + window * (offset / self.scope.getPeak())
+        self.drawArray(x, y, screen)
+        return True
+
+    def getMovingWaveRect(self, screenSize : tuple):
+        # the band drawMovingWave draws in, from 2 offsets above the bottom of the screen to the bottom (plus a pixel for the circles)
+        offset = screenSize[1]/6
+        top = int(screenSize[1] - 2 * offset) - 2
+        return pygame.Rect(0, top, screenSize[0], screenSize[1] - top)
+
+    #RENDER CACHE
+    def updateStaticLayer(self, screenSize : tuple):
+        """
+            ## updateStaticLayer
+            keeps the parts of the frame that only change on input (the background, full wave and text) on self.staticSurface, and only redraws them when the wave,
+            colors, draw mode, window size or text changed. Returns whether it was redrawn.
+
+            ### screenSize : tuple
+            the size of the window
+        """
+        data = self.getData()
+        key = (self.lineStartColor, self.lineEndColor, self.circleColor, self.drawMode, tuple(screenSize), data)
+        if self.staticSurface != None and key == self.staticKey and self.staticWave is self.wave:
+            return False
+
+        self.staticKey = key
+        self.staticWave = self.wave
+        self.staticSurface = pygame.Surface(screenSize)
+        self.staticSurface.fill(gb.BG_COLOR)
+        self.drawFullWave(self.staticSurface)
+        self.text.update(self.staticSurface, data)
+        return True
 
     def drawArray(self, x : np.array, y : np.array, screen, startPercent : float = 0, endPercent : float = 1):
         """
@@ -188,19 +542,58 @@ class Note:
             ending percent to use when rendering the line colors
             defaults to 1
         """
-        length = len(x)
-        for i in range(1, length):
-            percent = startPercent + ((endPercent - startPercent) * i/length)
-            color = gb.capColor(((self.lineEndColor[0] - self.lineStartColor[0]) * percent + self.lineStartColor[0], (self.lineEndColor[1] - self.lineStartColor[1]) * percent + self.lineStartColor[1], (self.lineEndColor[2] - self.lineStartColor[2]) * percent + self.lineStartColor[2]))
-            if self.drawMode == "Lines":
-                pygame.draw.line(screen, color, (x[i-1], y[i-1]), (x[i], y[i]))
-            elif self.drawMode == "Circles":
-                pygame.draw.circle(screen, self.circleColor, (x[i], y[i]), 1)
-            elif self.drawMode == "Both":
-                pygame.draw.line(screen, color, (x[i-1], y[i-1]), (x[i], y[i]))
-                pygame.draw.circle(screen, self.circleColor, (x[i], y[i]), 1)
-            else:
-                raise NameError(f"self.drawMode ({self.drawMode}) is not a valid draw mode.")
+        if self.drawMode not in self.drawModes:
+            raise NameError(f"self.drawMode ({self.drawMode}) is not a valid draw mode.")
+        if len(x) < 2:
+            return
+
+        with PROFILER.scope("drawArray"):
+            points = np.column_stack((x, y))
+            if self.drawMode in ("Lines", "Both"):
+                self.drawGradientLines(points, screen, startPercent, endPercent)
+            if self.drawMode in ("Circles", "Both"):
+                self.drawPoints(points[1:], screen)
+
+    def drawGradientLines(self, points : np.array, screen, startPercent : float, endPercent : float):
+        """
+            ## drawGradientLines
+            draws the line through points colored from self.lineStartColor to self.lineEndColor. The colors come from a precomputed gradient (gb.getGradient),
+            so every run of segments that share a color is drawn with one pygame.draw.lines call instead of one call per segment.
+        """
+        gradient = gb.getGradient(self.lineStartColor, self.lineEndColor)
+        length = len(points)
+
+        # the color of the segment ending at point i is picked at the percent of i, the same as it used to be per segment
+        percents = startPercent + (endPercent - startPercent) * np.arange(1, length) / length
+        colorIndexes = np.clip(np.rint(percents * (len(gradient) - 1)), 0, len(gradient) - 1).astype(np.intp)
+
+        runStarts = np.concatenate(([0], np.flatnonzero(np.diff(colorIndexes)) + 1))
+        runEnds = np.append(runStarts[1:], length - 1)
+        for start, end in zip(runStarts, runEnds):
+            pygame.draw.lines(screen, gradient[colorIndexes[start]], False, points[start:end + 1]) # segments start..end-1 go through points start..end
+
+    def drawPoints(self, points : np.array, screen):
+        """
+            ## drawPoints
+            draws a radius 1 circle (a 2x2 square of pixels, the same as pygame.draw.circle) at every point, written straight into the screen's pixels.
+        """
+        points = points[np.all(np.isfinite(points), axis=1)]
+        centerX = points[:, 0].astype(np.intp)
+        centerY = points[:, 1].astype(np.intp)
+        pixelX = np.concatenate((centerX - 1, centerX, centerX - 1, centerX))
+        pixelY = np.concatenate((centerY - 1, centerY - 1, centerY, centerY))
+
+        width, height = screen.get_size()
+        onScreen = (pixelX >= 0) & (pixelX < width) & (pixelY >= 0) & (pixelY < height)
+
+        try:
+            pixels = pygame.surfarray.pixels2d(screen)
+        except ValueError: # surfaces with 24 bit pixels can't be referenced as an array
+            for point in points:
+                pygame.draw.circle(screen, self.circleColor, point, 1)
+            return
+        pixels[pixelX[onScreen], pixelY[onScreen]] = screen.map_rgb(self.circleColor)
+        del pixels # unlocks the screen
 
     #USER INPUT
     def userInput(self, keys):
@@ -223,7 +616,7 @@ class Note:
                 name = instance[0]
                 convertedName = gb.cammelCase(name) #cammelCase version of the name string for use with setattr() and getattr()
 
-                key = instance[1]
+                key = getattr(pygame, instance[1])
                 valueChange = instance[2]
                 operation = instance[3]
 
@@ -235,12 +628,12 @@ class Note:
                         gb.cooldown += gb.DEFAULT_COOLDOWN
                         # Sets the attribute {convertedName} which is just {name} but formated to "cammelCasing" and it's given the value of itself + or * the value change. 
                         # These are determined in self.stateSettings in the init.
-                        setattr(self, convertedName, eval(f"{getattr(self, convertedName)} {operation} {valueChange}"))
-                        self.makeSound()
+                        setattr(self, convertedName, gb.applyOpp(getattr(self, convertedName), operation, valueChange))
+                        self.requestSound()
                     if keys[pygame.K_DOWN]:
                         gb.cooldown += gb.DEFAULT_COOLDOWN
-                        setattr(self, convertedName, eval(f"{getattr(self, convertedName)} {gb.inverseOpp(operation)} {valueChange}"))
-                        self.makeSound()
+                        setattr(self, convertedName, gb.applyOpp(getattr(self, convertedName), gb.inverseOpp(operation), valueChange))
+                        self.requestSound()
 
     def playButton(self):
         gb.cooldown += gb.DEFAULT_COOLDOWN
@@ -253,7 +646,7 @@ class Note:
             # resets all attributes stored in self.baseValues to what they were originally at the moment that self.baseValues was called last. (init)
             setattr(self, gb.cammelCase(instanceName), instanceValue)
         # then makes the soundwaves so that they can be properly rendered
-        self.makeSound()
+        self.requestSound()
 
     def getData(self):
         returnStr = ""
@@ -273,58 +666,220 @@ class Note:
         returnStr += f"-- FREQUENCY --\n"
         returnStr += f"{self.getFrequency()}\n\n"
 
+        if self.recordingStatus != None:
+            returnStr += f"-- RECORDING --\n"
+            returnStr += f"{self.recordingStatus}\n\n"
+
         return returnStr        
 
-    def keyboardInput(self):
-        def handle_midi_input(port):
-            print(f"Listening for MIDI input on '{port.name}'...")
-            buffer = []
-            while True:
-                message = port.receive()
-                if message.type == 'note_on' and message.velocity > 0:
-                    buffer.append(message)
-
-                if message.type == 'control_change':
-                    if message.control == 64:  # Sustain pedal
-                        if message.value > 0:
-                            self.mult = 2.5
-                        else:
-                            self.mult = 1
-                    if message.control == 66:
-                        if message.value > 0:
-                            if gb.cooldown == 0:
-                                gb.cooldown += gb.DEFAULT_COOLDOWN
-                                self.resetButton()
-
-                if len(buffer) > 0:
-                    for msg in buffer:
-                        self.strength = msg.velocity / 100
-                        self.frequency = fq[msg.note]
-                        self.duration = (msg.velocity / 100) * self.mult
-                        print(self.mult, self.duration)
-                        self.makeSound(fq[msg.note])
-                        pygame.mixer.Channel(self.currentChannel).play(self.sound)
-                        self.currentChannel += 1
-                        if self.currentChannel == self.channelMax:
-                            self.currentChannel = 0
-                    buffer.clear()
-
-               
+    def handleMidiMessage(self, message, buffer : list, receivedAt : float = None):
+        """
+            ## handleMidiMessage()
+            applies a control change right away and adds note_on messages to buffer to be played together, along with the sustain multiplier at the time they came in.
 
+            ### receivedAt : float
+            time.perf_counter() of when the message was read from the port, used to measure the latency of the note
+            defaults to None
+        """
+        if message.type == 'note_on' and message.velocity > 0:
+            buffer.append((message, self.mult, receivedAt))
+
+        if message.type == 'control_change':
+            if message.control == 64:  # Sustain pedal
+                if message.value > 0:
+                    self.mult = SUSTAIN_MULT
+                else:
+                    self.mult = 1
+            if message.control == 66:
+                if message.value > 0:
+                    self.resetRequested.set() # see adoptVoices()
+
+        recorder = self.recorder # can be stopped by the main thread at any time
+        if recorder != None:
+            if message.type == 'note_on' or message.type == 'note_off':
+                recorder.logEvent(message.type, note=message.note, velocity=message.velocity, sustain=self.mult)
+            elif message.type == 'control_change':
+                recorder.logEvent("control_change", control=message.control, value=message.value, sustain=self.mult)
+
+    def playMidiNotes(self, messages : list):
+        """
+            ## playMidiNotes()
+            plays every buffered (note_on message, sustain multiplier, time received) entry, the notes that aren't streamed are synthesized together with makeSounds().
+            Runs on the MIDI thread, so instead of setting any attributes every played note is pushed to self.voices as a Voice for the main thread to pick up.
+        """
+        notes = []
+        synthesized = [] # the message and time received of each of the notes in notes
+        bank = self.bank.getBank() if self.bank != None else None
+        for msg, mult, receivedAt in messages:
+            if msg.note not in fq: # outside the piano's 88 keys, the same as render.readNotes() and SampleBank.getSample() skip
+                continue
+            strength = msg.velocity / 100
+            duration = (msg.velocity / 100) * mult
+            info = {"note" : msg.note, "velocity" : msg.velocity, "sustain" : mult, "frequency" : fq[msg.note], "duration" : duration, "strength" : strength}
+            sample, gain = bank.getSample(msg.note, msg.velocity, mult) if bank != None else (None, None)
+            if sample is not None: # already rendered, nothing to synthesize
+                self.playSample(sample, gain, info)
+                self.recordLatency(receivedAt, "play")
+                self.voices.push(Voice(fq[msg.note], msg.velocity, strength, duration, time.time(), sample))
+            elif duration > self.streamDuration: # sustained notes are streamed rather than rendered up front
+                self.streamSound(fq[msg.note], duration, strength, info)
+                self.recordLatency(receivedAt, "play")
+                self.voices.push(Voice(fq[msg.note], msg.velocity, strength, duration, time.time()))
+            else:
+                notes.append((fq[msg.note], duration, strength))
+                synthesized.append((msg, receivedAt, info))
+
+        sounds = self.makeSounds(notes)
+        for _, receivedAt, _ in synthesized:
+            self.recordLatency(receivedAt, "synthesis")
+        for (wave, sound), (frequency, duration, strength), (msg, receivedAt, info) in zip(sounds, notes, synthesized):
+            self.playWave(wave, sound, info)
+            self.recordLatency(receivedAt, "play")
+            self.voices.push(Voice(frequency, msg.velocity, strength, duration, time.time(), wave, sound))
+
+    def adoptVoices(self):
+        """
+            ## adoptVoices()
+            picks up the voices the MIDI thread played since the last frame and makes the newest one the note on screen, and does a reset the MIDI thread asked for.
+            Only called from the main thread, so it is the only thread that sets the attributes the drawing reads.
+        """
+        if self.resetRequested.is_set():
+            self.resetRequested.clear()
+            if gb.cooldown == 0:
+                gb.cooldown += gb.DEFAULT_COOLDOWN
+                self.resetButton()
+
+        voices, self.voicePosition = self.voices.readSince(self.voicePosition)
+        if len(voices) == 0:
+            return
+
+        # the last note is the one shown on screen
+        last = voices[-1]
+        self.strength = last.strength
+        self.frequency = last.frequency
+        self.duration = last.duration
+
+        drawn = [voice for voice in voices if voice.wave is not None] # streamed notes don't have a wave to draw
+        if len(drawn) > 0:
+            self.setVoice(drawn[-1])
+            self.wave, self.sound = self.voice.wave, self.voice.sound
+            self.frames = self.voice.getFrames()
+
+    def setVoice(self, voice : Voice):
+        # the peak is found once per voice instead of every time it is drawn
+        self.voice = voice
+        self.voicePeak = max(int(np.max(np.abs(voice.wave))), 1) if voice.getFrames() > 0 else 1
+        self.lastDrawnIndex = 0
+
+    def recordLatency(self, receivedAt : float, stage : str):
+        if receivedAt != None:
+            self.latency.record(stage, time.perf_counter() - receivedAt)
+
+    def startRecording(self, directory : str = None):
+        """
+            ## startRecording()
+            records everything played from now on into directory (see recorder.SessionRecorder), a new sessions/session-<date>-<time> directory if it isn't given.
+            Only works with outputMode "Mixer", since the recording is of the mix.
+        """
+        if self.mixer == None:
+            raise ValueError(f"recording needs outputMode 'Mixer', not '{self.outputMode}'.")
+        if self.recorder != None:
+            return self.recorder
+        if directory == None:
+            directory = os.path.join("sessions", time.strftime("session-%Y%m%d-%H%M%S"))
+        self.recorder = SessionRecorder(directory, self.mixer).start()
+        self.recordingStatus = f"Recording to {directory}"
+        return self.recorder
+
+    def stopRecording(self):
+        """
+            ## stopRecording()
+            stops the recording started by startRecording() and returns its directory, or None if nothing was being recorded.
+        """
+        if self.recorder == None:
+            return None
+        recorder, self.recorder = self.recorder, None
+        directory = recorder.stop()
+        self.recordingStatus = f"Saved to {directory}"
+        return directory
+
+    def keyboardInput(self, port = None):
+        """
+            ## keyboardInput()
+            starts reading MIDI input in the background, see midi.MidiIngest. Uses the first MIDI input if port isn't given (a midi.FakePort can be given for testing).
+        """
         # if len(mido.get_input_names()) != 0:
-        port = mido.open_input(mido.get_input_names()[0])
-        listener_thread = threading.Thread(target=handle_midi_input, args=(port,))
-        listener_thread.daemon = True
-        listener_thread.start()
-        return listener_thread
+        if port == None:
+            port = mido.open_input(mido.get_input_names()[0])
+        print(f"Listening for MIDI input on '{port.name}'...")
+        return MidiIngest(port, self).start()
 
     def update(self, keys, screen = None):
-        self.userInput(keys)
+        """
+            ## update
+            handles input and draws the note to screen, returning the list of rects of the screen that changed (for pygame.display.update).
+            Only what changed is drawn, so nothing is drawn at all while the note is idle.
+        """
+        self.adoptVoices()
+        self.adoptSound()
+        with PROFILER.scope("userInput"):
+            self.userInput(keys)
         # if len(mido.get_input_names()) != 0:
-        if screen != None:
-            self.drawFullWave(screen)
-            self.drawMovingWave(screen)
-            self.text.update(screen, self.getData())
+        if screen == None:
+            return []
+
+        dirtyRects = []
+        with PROFILER.scope("staticLayer"):
+            if self.updateStaticLayer(screen.get_size()):
+                screen.blit(self.staticSurface, (0, 0))
+                dirtyRects.append(screen.get_rect())
+                self.profilerRect = None # the overlay was drawn over
+
+        if self.scope != None:
+            movingWaveDone = self.scope.isSilent()
+        else:
+            movingWaveDone = self.voice == None or self.lastDrawnIndex >= self.voice.getFrames()
+        if self.movingWaveDrawn or not movingWaveDone:
+            movingRect = self.getMovingWaveRect(screen.get_size())
+            with PROFILER.scope("movingWave"):
+                screen.blit(self.staticSurface, movingRect, movingRect) # erases last frame's moving wave
+                drawn = self.drawMovingWave(screen)
+            if drawn or self.movingWaveDrawn: # the erase has to reach the display too
+                dirtyRects.append(movingRect)
+            self.movingWaveDrawn = drawn
+        dirtyRects += self.drawProfiler(screen)
+        return dirtyRects
+
+    def drawProfiler(self, screen):
+        """
+            ## drawProfiler
+            draws the profiler overlay (profiler.PROFILER) in the top right of the screen every self.profilerRefresh seconds, and erases it once after the profiler is turned off.
+            Returns the rects that changed.
+        """
+        if not PROFILER.enabled:
+            if self.profilerRect == None:
+                return []
+            rect, self.profilerRect = self.profilerRect, None
+            screen.blit(self.staticSurface, rect, rect)
+            return [rect]
+
+        now = time.perf_counter()
+        if self.profilerRect != None and now - self.profilerUpdated < self.profilerRefresh:
+            return []
+        self.profilerUpdated = now
+
+        dirtyRects = []
+        if self.profilerRect != None:
+            screen.blit(self.staticSurface, self.profilerRect, self.profilerRect)
+            dirtyRects.append(self.profilerRect)
+
+        self.profilerText.text = PROFILER.getOverlayText(gb.FPS)
+        block = self.profilerText.getBlock()
+        rect = block.get_rect(topright=(screen.get_width() - 10, 10))
+        screen.blit(block, rect)
+        self.profilerRect = rect
+        dirtyRects.append(rect)
+        return dirtyRects
 
 class StringNote(Note):
     def __init__(self,
@@ -340,7 +895,9 @@ class StringNote(Note):
                  lineEndColor : tuple = (50, 255, 0),
                  circleColor : tuple = (255, 255, 255),
                  drawMode : str = "Lines",
-                 inputMethod : str = "Laptop"):
+                 inputMethod : str = "Laptop",
+                 synthMode : str = "Recurrence",
+                 outputMode : str = "Channels"):
        
         self.length = length
         self.n = n
@@ -348,11 +905,6 @@ class StringNote(Note):
         self.weight = weight # the linear density of the string
         self.strength = strength
 
-        if harmonics == None:
-            self.setHarmonics()
-        else:
-            self.harmonics = harmonics
-
         super().__init__(
             samplingRate = samplingRate,
             frequency = self.getFrequency(),
@@ -361,58 +913,60 @@ class StringNote(Note):
             lineStartColor = lineStartColor,
             lineEndColor = lineEndColor,
             drawMode = drawMode,
-            inputMethod = inputMethod
+            inputMethod = inputMethod,
+            synthMode = synthMode,
+            outputMode = outputMode
         )
 
+        # set after Note.__init__ so that self.soundCache exists when the harmonics are set
+        if harmonics == None:
+            self.setHarmonics()
+        else:
+            self.harmonics = harmonics
+
         self.stateSettings = [
-            ["Length", pygame.K_l, 1.1, "*"],
-            ["N", pygame.K_n, .1, "+"],
-            ["Tension", pygame.K_t, 1.05, "*"],
-            ["Weight", pygame.K_w, 1.05, "*"],
-            ["Strength", pygame.K_s, .05, "+"],
-            ["Duration", pygame.K_d, 1.1, "*"]
+            ["Length", "K_l", 1.1, "*"],
+            ["N", "K_n", .1, "+"],
+            ["Tension", "K_t", 1.05, "*"],
+            ["Weight", "K_w", 1.05, "*"],
+            ["Strength", "K_s", .05, "+"],
+            ["Duration", "K_d", 1.1, "*"]
         ]
 
         self.setBaseValues()
 
     #MISC
     def setHarmonics(self):
-        harmonicsLen = random.randint(3, 30) * 2
+        self.harmonics = makeHarmonics()
         # harmonicsLen = 5 * 2
         # len = 5
-        self.harmonics = [(.5 * (random.randint(0, 100)/100)) * (abs((i-(harmonicsLen/2))/(harmonicsLen))) if i % 2 == 0 else 0 for i in range(harmonicsLen)]
         # self.harmonics = [1 * (abs((i-(len/2))/(len))) if i % 2 == 0 else 0 for i in range(len)]
         # self.harmonics = [random.randint(0, 100)/100 for i in range(3)]
         # self.harmonics = .75 * np.cos(25 * np.linspace(0, 1, 500))
+        self.soundCache.clear() # every cached sound was made with the old harmonics
+        if self.bank != None:
+            self.bank.setHarmonics(self.harmonics)
 
-    #SOUND
-    def makeSound(self, frequency : float = None):
-        self.frames = int(self.duration * self.samplingRate)
-
-        timeFrame = np.linspace(0, self.duration, self.frames) # the time at i index for all frames
-
-        harmonics = self.harmonics.copy()
-        maxHarmonicVal = max(harmonics)
-        # for i in range(len(harmonics)):
-            # if harmonics[i]/maxHarmonicVal > self.strength: # limits the values changed to only those that exceed the max strength threshold.
-                # harmonics[i] = self.strength * maxHarmonicVal # just having this line alone gives more versatile and interesting results though.
-
-        self.wave = np.zeros_like(timeFrame)
-
-        if frequency == None:
-            frequency = self.getFrequency()
-        else:
-            self.frequency = frequency
-        for i, amplitude in enumerate(harmonics):
-            harmonicFrequency = frequency * (i + 1)
-            self.wave += amplitude * np.cos(2 * np.pi * harmonicFrequency * timeFrame) * (self.strength if self.strength <= 1 else 1)
+    def getHarmonicsKey(self, harmonics : list = None):
+        return fingerprint(self.harmonics if harmonics is None else harmonics)
 
-        # self.wave *= np.exp(-3 * timeFrame) # Exponential decay
-        self.wave *= np.concatenate((np.linspace(0, 1, 100), np.linspace(1, 0, self.frames - 100)))
+    def getEngineParameters(self):
+        """
+            ## getEngineParameters()
+            the "String" engine (synthesis.StringEngine) rings and darkens the way this string would. A heavier (more weight * length) string holds more energy
+            so it rings longer, and a faster wave speed (sqrt(tension / weight)) loses less of its high partials per second.
+        """
+        if self.synthMode != StringEngine.name:
+            return {}
+        waveSpeed = math.sqrt(self.tension / self.weight)
+        return {
+            "decayTime" : .06 * self.weight * self.length, # 3 seconds for the default string
+            "brightness" : waveSpeed / (waveSpeed + 8), # about .5 for the default string
+        }
 
-        self.wave = (32768 * self.wave).astype(np.int16)
-        stereoWave = np.asarray([self.wave, self.wave]).T
-        self.sound = pygame.sndarray.make_sound(stereoWave.copy())
+    #SOUND
+    def getHarmonics(self):
+        return self.harmonics
 
     # def makeSound(self, frequency : float = None):
     #     self.frames = int(self.duration * self.samplingRate)
@@ -440,8 +994,7 @@ class StringNote(Note):
     #USER INPUT
     def resetButton(self):
         gb.cooldown += gb.DEFAULT_COOLDOWN
+        self.setHarmonics() # before the reset so the sound it requests uses the new harmonics
         super().resetButton()
-        self.setHarmonics()
-        self.makeSound()
         self.lineStartColor = (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255))
         self.lineEndColor = (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255))
@@ -0,0 +1,82 @@
+import numpy as np
+
+class WaveOverview:
+    def __init__(self, wave : np.array, baseBlock : int = 16):
+        """
+            ## WaveOverview
+            min/max pyramid of a wave, like the peak files audio editors use. Level 0 holds the min and max of every baseBlock frames and every level above
+            halves the one below it, so any range of the wave can be reduced to a min and max per pixel by only reading about one entry per pixel.
+
+            ### wave : np.array
+            the wave to make the overview of, kept as a reference
+
+            ### baseBlock : int
+            frames per entry of the first level
+        """
+        self.wave = wave
+        self.baseBlock = baseBlock
+        self.frames = len(wave)
+
+        self.levels = [] # (block size, mins, maxs) from the finest level up
+        blocks = -(-self.frames // baseBlock)
+        padded = np.empty(blocks * baseBlock, dtype=wave.dtype)
+        padded[:self.frames] = wave
+        padded[self.frames:] = wave[-1] if self.frames > 0 else 0 # repeats the last frame so padding doesn't add a fake peak
+
+        mins = padded.reshape(blocks, baseBlock).min(axis=1)
+        maxs = padded.reshape(blocks, baseBlock).max(axis=1)
+        blockSize = baseBlock
+        while True:
+            self.levels.append((blockSize, mins, maxs))
+            if len(mins) <= 1:
+                break
+            if len(mins) % 2 == 1: # repeat the last entry so the level can be halved
+                mins = np.append(mins, mins[-1])
+                maxs = np.append(maxs, maxs[-1])
+            mins = np.minimum(mins[0::2], mins[1::2])
+            maxs = np.maximum(maxs[0::2], maxs[1::2])
+            blockSize *= 2
+
+        top = self.levels[-1]
+        self.peak = max(abs(int(top[1][0])), abs(int(top[2][0]))) if self.frames > 0 else 0 # the loudest the wave gets
+
+    def getRange(self, width : int, start : int = 0, end : int = None):
+        """
+            ## getRange()
+            returns (mins, maxs), the min and max of the wave for width evenly sized pieces of the frames [start, end).
+
+            ### width : int
+            the amount of pieces, usually the width in pixels
+
+            ### start : int
+            the first frame
+            defaults to 0
+
+            ### end : int
+            one past the last frame, the end of the wave if None
+            defaults to None
+        """
+        end = self.frames if end is None else min(end, self.frames)
+        width = max(1, min(int(width), end - start))
+        if end - start <= 0:
+            return np.zeros(0, dtype=self.wave.dtype), np.zeros(0, dtype=self.wave.dtype)
+
+        framesPerPiece = (end - start) / width
+        edges = start + (np.arange(width) * framesPerPiece).astype(np.intp) # first frame of every piece
+
+        # the coarsest level with at least 4 blocks per piece, so a piece's edges are off by at most a quarter of a piece
+        blockSize, mins, maxs = None, self.wave, self.wave
+        for level in self.levels:
+            if level[0] * 4 > framesPerPiece:
+                break
+            blockSize, mins, maxs = level
+
+        if blockSize is None: # pieces smaller than 4 level 0 blocks, read the wave itself
+            return np.minimum.reduceat(self.wave[start:end], edges - start), np.maximum.reduceat(self.wave[start:end], edges - start)
+
+        firstBlock = start // blockSize
+        lastBlock = -(-end // blockSize) # one past the block holding the last frame
+        blockEdges = np.maximum(edges // blockSize, firstBlock) - firstBlock
+        blockEdges = np.maximum.accumulate(blockEdges) # reduceat needs the edges in order
+        return (np.minimum.reduceat(mins[firstBlock:lastBlock], blockEdges),
+                np.maximum.reduceat(maxs[firstBlock:lastBlock], blockEdges))
@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import threading
+import numpy as np
+
+class NullScope:
+    """
+        ## NullScope
+        what Profiler.scope() returns while the profiler is off, entering and leaving it does nothing.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        return False
+
+NULL_SCOPE = NullScope()
+
+class Scope:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name : str):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        self.profiler.record(self.name, self.start, time.perf_counter() - self.start)
+        return False
+
+class StageRing:
+    def __init__(self, capacity : int):
+        # start time, duration (seconds) and thread of the last capacity timings of a stage, made once when the stage is first timed
+        self.starts = np.zeros(capacity)
+        self.durations = np.zeros(capacity)
+        self.threads = np.zeros(capacity, dtype=np.int64)
+        self.written = 0
+
+    def getLatest(self, count : int):
+        # the durations of the last count timings, oldest first
+        count = min(count, self.written, len(self.durations))
+        end = self.written % len(self.durations)
+        if count <= end:
+            return self.durations[end - count:end]
+        return np.concatenate((self.durations[end - count:], self.durations[:end]))
+
+class Profiler:
+    def __init__(self, enabled : bool = False, capacity : int = 4096):
+        """
+            ## Profiler
+            times named stages (like "frame", "userInput" or "mix") from any thread into a preallocated ring per stage. While it is off, scope() hands back
+            NULL_SCOPE, so timing a stage costs one method call and an empty with block.
+
+            ### enabled : bool
+            whether stages are timed
+            defaults to False
+
+            ### capacity : int
+            timings kept per stage, older ones are overwritten
+        """
+        self.enabled = enabled
+        self.capacity = capacity
+        self.stages = {} # name -> StageRing
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter() # trace times are relative to this
+        self.status = None # the last thing exportTrace() did, shown at the bottom of the overlay
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        return self.enabled
+
+    def scope(self, name : str):
+        """
+            ## scope()
+            use as "with PROFILER.scope(name):" around the code to time.
+        """
+        if not self.enabled:
+            return NULL_SCOPE
+        return Scope(self, name)
+
+    def record(self, name : str, start : float, duration : float):
+        with self.lock:
+            ring = self.stages.get(name)
+            if ring is None:
+                ring = self.stages[name] = StageRing(self.capacity)
+            slot = ring.written % self.capacity
+            ring.starts[slot] = start
+            ring.durations[slot] = duration
+            ring.threads[slot] = threading.get_ident()
+            ring.written += 1
+
+    def clear(self):
+        with self.lock:
+            self.stages = {}
+
+    def getStats(self, window : int = 60):
+        """
+            ## getStats()
+            returns {stage : {"ms", "maxMs", "count"}}, the mean and max ms of the last window timings of every stage and how many times it was timed in total.
+        """
+        with self.lock:
+            stats = {}
+            for name, ring in self.stages.items():
+                durations = ring.getLatest(window)
+                stats[name] = {
+                    "ms" : float(durations.mean() * 1000) if len(durations) > 0 else 0,
+                    "maxMs" : float(durations.max() * 1000) if len(durations) > 0 else 0,
+                    "count" : ring.written,
+                }
+            return stats
+
+    def getOverlayText(self, fps : int, window : int = 60):
+        """
+            ## getOverlayText()
+            the lines shown by Note.drawProfiler, the frame's ms against the frame budget of fps and the ms of every other stage.
+        """
+        stats = self.getStats(window)
+        budget = 1000 / fps
+        text = "-- PROFILER --\n"
+        if "frame" in stats:
+            frame = stats["frame"]
+            text += f"frame: {frame['ms']:.2f} ms (max {frame['maxMs']:.2f}) / {budget:.1f} ms, {frame['ms'] / budget * 100:.0f}% of budget\n"
+        for name, stage in sorted(stats.items()):
+            if name != "frame":
+                text += f"{name}: {stage['ms']:.2f} ms (max {stage['maxMs']:.2f})\n"
+        if self.status != None:
+            text += f"{self.status}\n"
+        return text
+
+    def exportTrace(self, path : str):
+        """
+            ## exportTrace()
+            writes every kept timing to path as a Chrome trace (open it in chrome://tracing or Perfetto), one complete ("X") event per timing, making path's directory if needed.
+            Returns the amount of events, which is also shown on the overlay.
+        """
+        events = []
+        with self.lock:
+            for name, ring in self.stages.items():
+                kept = min(ring.written, self.capacity)
+                for slot in range(kept):
+                    events.append({
+                        "name" : name,
+                        "ph" : "X",
+                        "ts" : (ring.starts[slot] - self.origin) * 1e6, # microseconds
+                        "dur" : ring.durations[slot] * 1e6,
+                        "pid" : os.getpid(),
+                        "tid" : int(ring.threads[slot]),
+                    })
+        events.sort(key=lambda event: event["ts"])
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as file:
+            json.dump({"traceEvents" : events, "displayTimeUnit" : "ms"}, file)
+        self.status = f"saved {len(events)} timings to {path}"
+        return len(events)
+
+PROFILER = Profiler(enabled=os.environ.get("SYNTH_PROFILE") == "1")
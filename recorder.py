@@ -0,0 +1,375 @@
+import os
+import json
+import time
+import wave
+import hashlib
+import argparse
+import threading
+import numpy as np
+from collections import deque
+from mixer import Mixer, MixerVoice, StreamVoice, NullSink
+from synthesis import getEngine, streamNote
+
+SESSION_VERSION = 1 # bump whenever the session files change, so old sessions aren't replayed wrong
+
+class WaveSegments:
+    def __init__(self, prefix : str, samplingRate : int = 44100, segmentFrames : int = 44100 * 3600):
+        """
+            ## WaveSegments
+            writes mono int16 blocks as 16 bit stereo WAV files named prefix-000.wav, prefix-001.wav, ..., starting a new file every segmentFrames frames
+            (a single WAV file can't hold more than about 6 hours).
+
+            ### segmentFrames : int
+            frames per file
+            defaults to an hour
+        """
+        self.prefix = prefix
+        self.samplingRate = samplingRate
+        self.segmentFrames = segmentFrames
+        self.paths = []
+        self.file = None
+        self.fileFrames = 0
+        self.stereo = np.zeros((4096, 2), dtype=np.int16) # reused for every write, grown if a block is bigger
+
+    def openNext(self):
+        if self.file != None:
+            self.file.close()
+        path = f"{self.prefix}-{len(self.paths):03}.wav"
+        self.file = wave.open(path, "wb")
+        self.file.setnchannels(2)
+        self.file.setsampwidth(2)
+        self.file.setframerate(self.samplingRate)
+        self.paths.append(path)
+        self.fileFrames = 0
+
+    def write(self, block : np.array):
+        if len(block) > len(self.stereo):
+            self.stereo = np.zeros((len(block), 2), dtype=np.int16)
+        written = 0
+        while written < len(block):
+            if self.file == None or self.fileFrames >= self.segmentFrames:
+                self.openNext()
+            frames = min(len(block) - written, self.segmentFrames - self.fileFrames)
+            stereo = self.stereo[:frames]
+            stereo[:, 0] = block[written:written + frames]
+            stereo[:, 1] = stereo[:, 0]
+            self.file.writeframes(memoryview(stereo).cast("B"))
+            self.fileFrames += frames
+            written += frames
+
+    def writeSilence(self, frames : int):
+        silence = np.zeros(min(frames, len(self.stereo)), dtype=np.int16)
+        while frames > 0:
+            self.write(silence[:frames])
+            frames -= len(silence[:frames])
+
+    def close(self):
+        if self.file != None:
+            self.file.close()
+            self.file = None
+
+class SessionRecorder:
+    def __init__(self,
+                 directory : str,
+                 mixer : Mixer,
+                 buffers : int = 64,
+                 segmentSeconds : float = 3600,
+                 interval : float = .05):
+        """
+            ## SessionRecorder
+            records everything the mixer plays into directory: the mix as WAV files (session-000.wav, ...), every voice that starts or stops and every
+            note event given to logEvent() as JSON lines (events.jsonl), the waves of the played voices (samples/, each one saved once) and session.json.
+            replaySession() renders the same mix again from those files alone, down to the bit.
+
+            The mixer's thread only copies each block into one of a fixed amount of preallocated buffers, a writer thread saves them every interval seconds,
+            so recording never waits on the disk and uses the same memory after hours as after seconds. If the writer falls behind by more than all of the
+            buffers, blocks are dropped (written as silence) and counted instead of holding up the mix.
+
+            ### buffers : int
+            blocks of the mix that can wait for the writer at once
+            defaults to 64 (about 1.5 seconds at 1024 frames per block)
+
+            ### segmentSeconds : float
+            seconds of audio per WAV file
+
+            ### interval : float
+            seconds the writer sleeps between saving what came in
+        """
+        self.directory = directory
+        self.mixer = mixer
+        self.segmentFrames = int(segmentSeconds * mixer.samplingRate)
+        self.interval = interval
+
+        # the audio buffers are handed between the two threads by index, deque appends and pops don't need a lock
+        self.buffers = np.zeros((buffers, mixer.blockSize), dtype=np.int16)
+        self.free = deque(range(buffers))
+        self.filled = deque() # (buffer index, frames, mixer frame) of the blocks waiting to be written
+        self.events = deque() # voice and note events waiting to be written
+
+        self.savedSamples = set() # hashes of the voice waves already in samples/
+        self.startFrame = None
+        self.endFrame = None
+        self.nextFrame = None # the mixer frame the next written block has to start at
+        self.startedAt = None
+        self.droppedBlocks = 0
+        self.writtenFrames = 0
+        self.thread = None
+        self.stopEvent = threading.Event()
+        self.audio = None
+        self.eventFile = None
+
+    #RECORDING
+    def start(self):
+        if self.thread != None:
+            return self
+        os.makedirs(os.path.join(self.directory, "samples"), exist_ok=True)
+        self.audio = WaveSegments(os.path.join(self.directory, "session"), self.mixer.samplingRate, self.segmentFrames)
+        self.eventFile = open(os.path.join(self.directory, "events.jsonl"), "w")
+        self.startedAt = time.perf_counter()
+        self.stopEvent.clear()
+
+        self.startFrame = self.nextFrame = self.mixer.addListener(self)
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """
+            ## stop()
+            stops recording, waits for everything to be written and saves session.json. Returns the session's directory.
+        """
+        if self.thread == None:
+            return self.directory
+        self.endFrame = self.mixer.removeListener(self)
+        self.stopEvent.set()
+        self.thread.join()
+        self.thread = None
+
+        with open(os.path.join(self.directory, "session.json"), "w") as file:
+            json.dump({
+                "version" : SESSION_VERSION,
+                "samplingRate" : self.mixer.samplingRate,
+                "blockSize" : self.mixer.blockSize,
+                "polyphony" : self.mixer.polyphony,
+                "startFrame" : self.startFrame,
+                "endFrame" : self.endFrame,
+                "segmentFrames" : self.segmentFrames,
+                "droppedBlocks" : self.droppedBlocks,
+                "wavs" : [os.path.basename(path) for path in self.audio.paths],
+            }, file)
+        return self.directory
+
+    def isRecording(self):
+        return self.thread != None
+
+    def logEvent(self, kind : str, **fields):
+        """
+            ## logEvent()
+            adds a note event (like a MIDI note_on or the sustain pedal) to events.jsonl, with the seconds since the recording started and the mixer frame it happened at.
+            Can be called from any thread.
+        """
+        self.events.append({"event" : kind, "time" : time.perf_counter() - self.startedAt, "frame" : self.mixer.frame, **fields})
+
+    #MIXER LISTENER
+    def voiceStarted(self, voice : MixerVoice, frame : int):
+        self.events.append(("start", voice, frame, frame - voice.startFrame)) # frames of it that were mixed before frame
+
+    def voiceStopped(self, voice : MixerVoice, frame : int):
+        self.events.append(("stop", voice, frame, None))
+
+    def blockMixed(self, block : np.array, frame : int):
+        # on the mixer's thread, a copy into a free buffer and nothing else
+        if len(self.free) == 0:
+            self.droppedBlocks += 1
+            return
+        index = self.free.popleft()
+        frames = min(len(block), self.buffers.shape[1])
+        self.buffers[index, :frames] = block[:frames]
+        self.filled.append((index, frames, frame))
+
+    #WRITER
+    def run(self):
+        while not self.stopEvent.wait(self.interval):
+            self.writeEvents()
+            self.writeAudio()
+
+        # the last block before endFrame can still be on its way from the mixer
+        deadline = time.perf_counter() + 1
+        while self.nextFrame < self.endFrame and time.perf_counter() < deadline:
+            self.writeAudio()
+            time.sleep(.005)
+        self.writeAudio()
+        if self.nextFrame < self.endFrame: # the mixer stopped before it got there
+            self.audio.writeSilence(self.endFrame - self.nextFrame)
+            self.nextFrame = self.endFrame
+        self.writeEvents()
+        self.audio.close()
+        self.eventFile.close()
+
+    def writeAudio(self):
+        while len(self.filled) > 0:
+            index, frames, frame = self.filled.popleft()
+            if frame > self.nextFrame: # blocks were dropped, silence keeps the rest of the file in time
+                self.audio.writeSilence(frame - self.nextFrame)
+            self.audio.write(self.buffers[index, :frames])
+            self.free.append(index)
+            self.nextFrame = frame + frames
+            self.writtenFrames = self.nextFrame - self.startFrame
+
+    def writeEvents(self):
+        lines = []
+        while len(self.events) > 0:
+            event = self.events.popleft()
+            if isinstance(event, dict):
+                lines.append(json.dumps(event))
+                continue
+
+            kind, voice, frame, played = event
+            if kind == "stop":
+                lines.append(json.dumps({"event" : "stop", "frame" : frame, "voice" : voice.number}))
+                continue
+
+            line = {"event" : "start", "frame" : frame, "voice" : voice.number, "gain" : voice.gain, "offset" : played}
+            info = dict(voice.info) if voice.info != None else {}
+            if isinstance(voice, StreamVoice): # replayed by rendering it again, see Note.streamSound() for what info holds
+                if "harmonics" in info:
+                    info["harmonics"] = np.asarray(info["harmonics"], dtype=np.float64).tolist()
+                line["stream"] = True
+            else:
+                line["sample"] = self.saveSample(voice.buffer)
+            line["info"] = info
+            lines.append(json.dumps(line))
+
+        if len(lines) > 0:
+            self.eventFile.write("\n".join(lines) + "\n")
+            self.eventFile.flush()
+
+    def saveSample(self, buffer : np.array):
+        # saves the wave under the hash of its samples, so a note played a thousand times is saved once
+        samples = np.ascontiguousarray(buffer, dtype=np.int16)
+        name = hashlib.blake2b(samples.tobytes(), digest_size=16).hexdigest()
+        if name not in self.savedSamples:
+            path = os.path.join(self.directory, "samples", name + ".npy")
+            if not os.path.exists(path):
+                np.save(path, samples)
+            self.savedSamples.add(name)
+        return name
+
+    def getStats(self):
+        return {
+            "seconds" : self.writtenFrames / self.mixer.samplingRate,
+            "waitingBlocks" : len(self.filled),
+            "waitingEvents" : len(self.events),
+            "droppedBlocks" : self.droppedBlocks,
+            "samples" : len(self.savedSamples),
+        }
+
+def readSession(directory : str):
+    with open(os.path.join(directory, "session.json")) as file:
+        header = json.load(file)
+    if header["version"] != SESSION_VERSION:
+        raise ValueError(f"{directory} is a version {header['version']} session, expected version {SESSION_VERSION}.")
+    return header
+
+def readVoiceEvents(directory : str):
+    # the start and stop events of events.jsonl in the order they happened
+    with open(os.path.join(directory, "events.jsonl")) as file:
+        for line in file:
+            event = json.loads(line)
+            if event["event"] in ("start", "stop"):
+                yield event
+
+def replaySession(directory : str, prefix : str = "replay"):
+    """
+        ## replaySession()
+        renders a session recorded by SessionRecorder again from its events and samples, into directory/prefix-000.wav, ... Voices are started and stopped at the
+        same mixer frames as when it was recorded and streamed voices are synthesized again with the same engine, so unless blocks were dropped while recording
+        the result is the same as the recorded WAVs. Returns the paths of the written files.
+    """
+    header = readSession(directory)
+    samplingRate = header["samplingRate"]
+    mixer = Mixer(samplingRate, header["blockSize"], header["polyphony"], NullSink(samplingRate))
+    mixer.frame = header["startFrame"]
+    output = WaveSegments(os.path.join(directory, prefix), samplingRate, header["segmentFrames"])
+
+    samples = {} # hash -> memory mapped wave
+    engines = {} # (synthMode, parameters) -> engine
+    playing = {} # voice number -> replayed voice
+
+    def startVoice(event):
+        info = event["info"]
+        if event.get("stream"):
+            engineKey = (info["synthMode"], json.dumps(info["engineParameters"], sort_keys=True))
+            if engineKey not in engines:
+                engines[engineKey] = getEngine(info["synthMode"], **info["engineParameters"])
+            chunks = streamNote(engines[engineKey], info["frequency"], info["duration"], info["strength"], info["harmonics"], info["samplingRate"], info["chunkFrames"])
+            voice = StreamVoice(chunks, event["gain"], info=info)
+        else:
+            if event["sample"] not in samples:
+                samples[event["sample"]] = np.load(os.path.join(directory, "samples", event["sample"] + ".npy"), mmap_mode="r")
+            voice = MixerVoice(samples[event["sample"]], event["gain"], info=info)
+        voice.skip(event["offset"])
+        playing[event["voice"]] = mixer.startVoice(voice)
+
+    events = readVoiceEvents(directory)
+    event = next(events, None)
+    block = mixer.makeBlock()
+    for frame in range(header["startFrame"], header["endFrame"], mixer.blockSize):
+        while event != None and event["frame"] <= frame:
+            if event["event"] == "start":
+                startVoice(event)
+            elif event["voice"] in playing:
+                mixer.removeVoice(playing.pop(event["voice"]))
+            event = next(events, None)
+        output.write(mixer.callback(block)[:, 0])
+
+        if len(playing) > 4 * mixer.polyphony: # forgets the voices that ended on their own
+            playing = {number : voice for number, voice in playing.items() if voice in mixer.voices}
+    output.close()
+    return output.paths
+
+def readWaves(paths : list):
+    # yields the frames of WAV files one after the other, a second at a time
+    for path in paths:
+        with wave.open(path, "rb") as file:
+            while True:
+                data = file.readframes(file.getframerate())
+                if len(data) == 0:
+                    break
+                yield data
+
+def compareSession(directory : str, prefix : str = "replay"):
+    """
+        ## compareSession()
+        returns True if the WAVs replaySession() wrote with prefix hold exactly the same audio as the recorded ones.
+    """
+    header = readSession(directory)
+    replayed = [os.path.join(directory, f"{prefix}-{i:03}.wav") for i in range(len(header["wavs"]))]
+    recorded = [os.path.join(directory, name) for name in header["wavs"]]
+    left, right = readWaves(recorded), readWaves(replayed) # compared a second at a time so hours of audio don't have to fit in memory
+    leftData, rightData = b"", b""
+    while True:
+        if len(leftData) == 0:
+            leftData = next(left, b"")
+        if len(rightData) == 0:
+            rightData = next(right, b"")
+        if len(leftData) == 0 or len(rightData) == 0:
+            return len(leftData) == len(rightData)
+        length = min(len(leftData), len(rightData))
+        if leftData[:length] != rightData[:length]:
+            return False
+        leftData, rightData = leftData[length:], rightData[length:]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Renders a session recorded by SessionRecorder again and checks it against the recording.")
+    parser.add_argument("session", help="the session's directory")
+    parser.add_argument("--prefix", default="replay", help="name of the rendered WAV files")
+    args = parser.parse_args()
+
+    header = readSession(args.session)
+    paths = replaySession(args.session, args.prefix)
+    print(f"Rendered {(header['endFrame'] - header['startFrame']) / header['samplingRate']:.1f} seconds to {', '.join(paths)}")
+    if header["droppedBlocks"] > 0:
+        print(f"{header['droppedBlocks']} blocks were dropped while recording, the replay won't match there")
+    print("Matches the recording" if compareSession(args.session, args.prefix) else "Doesn't match the recording")
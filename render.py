@@ -0,0 +1,153 @@
+import os
+import wave
+import random
+import argparse
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from synthesis import getEngine, makeHarmonics, renderNote
+from frequencies import freqList as fq
+
+SUSTAIN_MULT = 2.5 # how much longer notes are with the sustain pedal down, also used by Note.handleMidiMessage so live and offline notes are the same length
+
+def readNotes(path : str):
+    """
+        ## readNotes()
+        yields (start time, frequency, duration, strength) for every note of a MIDI file in the order they start, mapping velocity and the sustain pedal (CC64)
+        to strength and duration the same way Note.playMidiNotes does. Notes outside of frequencies.freqList are skipped.
+
+        ### path : str
+        the MIDI file
+    """
+    import mido # only needed to read the file, not by the worker processes
+
+    mult = 1
+    now = 0
+    for message in mido.MidiFile(path): # message.time is the seconds since the last message
+        now += message.time
+        if message.type == 'note_on' and message.velocity > 0 and message.note in fq:
+            yield now, fq[message.note], (message.velocity / 100) * mult, message.velocity / 100
+
+        if message.type == 'control_change' and message.control == 64: # Sustain pedal
+            mult = SUSTAIN_MULT if message.value > 0 else 1
+
+engines = {} # one engine per synthesis mode per worker process
+
+def renderVoice(synthMode : str, frequency : float, duration : float, strength : float, harmonics : list, samplingRate : int):
+    # runs in the worker processes
+    if synthMode not in engines:
+        engines[synthMode] = getEngine(synthMode)
+    return renderNote(engines[synthMode], frequency, duration, strength, harmonics, samplingRate)
+
+class StreamedMix:
+    def __init__(self, path : str, samplingRate : int = 44100, blockFrames : int = 44100):
+        """
+            ## StreamedMix
+            adds voices into blocks of blockFrames and writes every block to a 16 bit stereo WAV file as soon as no later voice can reach it anymore.
+            Voices have to be added in the order they start, then only the blocks under the voices still ringing are kept in memory.
+        """
+        self.blockFrames = blockFrames
+        self.blocks = {} # block index -> int32 sums of the voices in that block
+        self.nextBlock = 0 # the first block that hasn't been written yet
+
+        self.file = wave.open(path, "wb")
+        self.file.setnchannels(2)
+        self.file.setsampwidth(2)
+        self.file.setframerate(samplingRate)
+        self.stereo = np.zeros((blockFrames, 2), dtype=np.int16)
+
+    def add(self, startFrame : int, voice : np.array):
+        self.flush(startFrame // self.blockFrames) # nothing starting from here on can reach the blocks before this one
+
+        position = startFrame
+        end = startFrame + len(voice)
+        while position < end:
+            blockIndex = position // self.blockFrames
+            if blockIndex not in self.blocks:
+                self.blocks[blockIndex] = np.zeros(self.blockFrames, dtype=np.int32)
+            blockStart = position - blockIndex * self.blockFrames
+            length = min(end - position, self.blockFrames - blockStart)
+            self.blocks[blockIndex][blockStart:blockStart + length] += voice[position - startFrame:position - startFrame + length]
+            position += length
+
+    def flush(self, untilBlock : int):
+        while self.nextBlock < untilBlock:
+            block = self.blocks.pop(self.nextBlock, None)
+            if block is None:
+                self.stereo.fill(0)
+            else:
+                np.clip(block, -32768, 32767, out=block) # the same clipping as Mixer.callback
+                self.stereo[:, 0] = block
+                self.stereo[:, 1] = block
+            self.file.writeframes(self.stereo.tobytes())
+            self.nextBlock += 1
+
+    def close(self):
+        self.flush(max(self.blocks, default=-1) + 1)
+        self.file.close()
+
+def renderMidiFile(path : str,
+                   outPath : str,
+                   harmonics : list,
+                   synthMode : str = "Recurrence",
+                   samplingRate : int = 44100,
+                   processes : int = None,
+                   maxInFlight : int = None):
+    """
+        ## renderMidiFile()
+        renders a MIDI file to a WAV file faster than realtime. The voices are synthesized by a pool of worker processes and mixed in order into a StreamedMix,
+        with at most maxInFlight voices waiting at once, so memory doesn't grow with the length of the file. Returns the amount of voices rendered.
+
+        ### path : str
+        the MIDI file
+
+        ### outPath : str
+        the WAV file to write
+
+        ### harmonics : list
+        the harmonics of the string, the same as StringNote.harmonics
+
+        ### synthMode : str
+        the synthesis engine, a key of synthesis.ENGINES
+        defaults to "Recurrence"
+
+        ### processes : int
+        amount of worker processes, one per cpu if None
+        defaults to None
+
+        ### maxInFlight : int
+        the most voices submitted to the pool and not mixed yet, 16 per process if None
+        defaults to None
+    """
+    processes = processes or os.cpu_count()
+    maxInFlight = maxInFlight or processes * 16
+    mix = StreamedMix(outPath, samplingRate)
+    inFlight = deque() # (start frame, future) in the order the notes start
+    voices = 0
+
+    with ProcessPoolExecutor(processes) as pool:
+        for start, frequency, duration, strength in readNotes(path):
+            inFlight.append((int(round(start * samplingRate)), pool.submit(renderVoice, synthMode, frequency, duration, strength, harmonics, samplingRate)))
+            while len(inFlight) >= maxInFlight:
+                startFrame, future = inFlight.popleft()
+                mix.add(startFrame, future.result())
+                voices += 1
+
+        while len(inFlight) > 0:
+            startFrame, future = inFlight.popleft()
+            mix.add(startFrame, future.result())
+            voices += 1
+
+    mix.close()
+    return voices
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Renders a MIDI file to a WAV file with the StringNote synthesis.")
+    parser.add_argument("midi")
+    parser.add_argument("wav")
+    parser.add_argument("--synth", default="Recurrence", help="synthesis engine")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=None, help="seed for the random harmonics")
+    args = parser.parse_args()
+
+    renderMidiFile(args.midi, args.wav, makeHarmonics(rng=random.Random(args.seed)), args.synth, processes=args.processes)
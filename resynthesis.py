@@ -0,0 +1,91 @@
+import threading
+
+class SynthWorker:
+    def __init__(self, render):
+        """
+            ## SynthWorker
+            renders sounds on a background thread, keeping only the newest request. Requests that come in while a render is running replace each other,
+            so holding a key down renders the first and the last value rather than every value in between.
+
+            ### render : function
+            called on the worker thread with the arguments given to request(), its return value (or the exception it raised) is what getResult() hands back
+        """
+        self.render = render
+        self.pending = None # (key, args) of the newest request that hasn't been started yet
+        self.result = None # (key, result) of the last finished render that hasn't been picked up yet
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.running = False
+        self.rendering = False
+        self.thread = None
+
+        self.requests = 0
+        self.renders = 0
+
+    def start(self):
+        if self.running:
+            return self
+        self.running = True
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        self.wake.set()
+        if self.thread != None:
+            self.thread.join(timeout=1)
+
+    def request(self, key, *args):
+        """
+            ## request()
+            asks for render(*args) to be made in the background, replacing any request that hasn't been started yet. key is handed back with the result.
+        """
+        with self.lock:
+            self.pending = (key, args)
+            self.requests += 1
+        self.wake.set()
+
+    def run(self):
+        while self.running:
+            self.wake.wait()
+            with self.lock:
+                self.wake.clear()
+                pending, self.pending = self.pending, None
+                self.rendering = pending != None
+            if pending == None:
+                continue
+
+            key, args = pending
+            try:
+                result = self.render(*args)
+            except Exception as error: # handed back instead of killing the thread, see getResult()
+                print(f"SynthWorker render failed: {error!r}")
+                result = error
+            with self.lock:
+                self.result = (key, result)
+                self.rendering = False
+                self.renders += 1
+
+    def getResult(self):
+        """
+            ## getResult()
+            returns (key, result) of the newest finished render and forgets it, or None if nothing finished since the last call.
+            If the render raised, result is the exception.
+        """
+        with self.lock:
+            result, self.result = self.result, None
+            return result
+
+    def isBusy(self):
+        with self.lock:
+            return self.pending != None or self.rendering
+
+    def getStats(self):
+        with self.lock:
+            return {
+                "requests" : self.requests,
+                "renders" : self.renders,
+                "coalesced" : self.requests - self.renders - (self.pending != None) - self.rendering, # replaced before they were started
+            }
@@ -0,0 +1,744 @@
+import math
+import random
+import threading
+import numpy as np
+from cache import fingerprint
+
+FADE_IN_FRAMES = 100 # length of the linear fade in at the start of every note
+BLOCK_FRAMES = 8192 # the most frames any in place step works on at once
+FRAME_OFFSETS = np.arange(BLOCK_FRAMES, dtype=np.float64) # 0, 1, 2... added onto a block's first frame instead of making a new arange for every block
+FRAME_OFFSETS.flags.writeable = False
+
+LOCAL = threading.local() # per thread scratch used by applyEnvelope()
+
+def makeHarmonics(harmonicsLen : int = None, rng : random.Random = random):
+    """
+        ## makeHarmonics()
+        makes a random harmonics list, every odd index is zero and the rest get quieter towards the middle of the list.
+
+        ### harmonicsLen : int
+        the length of the list, a random even number from 6 to 60 if None
+        defaults to None
+
+        ### rng : random.Random
+        where the random numbers come from, a seeded random.Random makes the same harmonics every time
+        defaults to the random module
+    """
+    if harmonicsLen == None:
+        harmonicsLen = rng.randint(3, 30) * 2
+    return [(.5 * (rng.randint(0, 100)/100)) * (abs((i-(harmonicsLen/2))/(harmonicsLen))) if i % 2 == 0 else 0 for i in range(harmonicsLen)]
+
+class SynthesisEngine:
+    """
+        ## SynthesisEngine
+        base class for the additive synthesis engines used by Note.makeSound. An engine only sums the partials of a note, the strength, envelope and int16 conversion are applied by renderNote().
+    """
+    name = None
+    release = None # seconds the note fades out over at its end, None fades out over the whole note
+
+    def __init__(self):
+        self.local = threading.local() # per thread scratch arrays, see getScratch()
+
+    def render(self,
+               frequency : float,
+               harmonics : list,
+               frames : int,
+               samplingRate : int,
+               start : int = 0,
+               out : np.array = None,
+               state : dict = None):
+        """
+            ## render()
+            returns the sum of harmonics[i] * cos(2pi * frequency * (i+1) * t) for the frames [start, start + frames) of a note.
+
+            ### frequency : float
+            the fundamental frequency
+
+            ### harmonics : list
+            the amplitude of every harmonic, harmonics[0] is the fundamental
+
+            ### frames : int
+            the amount of frames to render
+
+            ### samplingRate : int
+            frames per second
+
+            ### start : int
+            the index of the first frame to render, used to render a note in pieces
+            defaults to 0
+
+            ### out : np.array
+            array of at least frames length to render into, a new float64 array is made if None
+            defaults to None
+
+            ### state : dict
+            kept by whoever renders a note in pieces and given to every render of that note, engines that carry something over from one piece to the next (StringEngine) keep it in here.
+            Nothing is carried over if None
+            defaults to None
+        """
+        raise NotImplementedError
+
+    def renderBatch(self,
+                    frequencies : list,
+                    harmonics : list,
+                    frames : list,
+                    samplingRate : int,
+                    outs : list = None):
+        """
+            ## renderBatch()
+            renders several notes with the same harmonics at once, returning a list with one array per note.
+            Engines without a vectorized version render them one at a time.
+
+            ### frequencies : list
+            the fundamental frequency of every note
+
+            ### frames : list
+            the length of every note in frames
+
+            ### outs : list
+            an array of at least frames[i] length to render every note into, new float64 arrays are made if None
+            defaults to None
+        """
+        outs = [None] * len(frames) if outs is None else outs
+        return [self.render(frequency, harmonics, noteFrames, samplingRate, out=out) for frequency, noteFrames, out in zip(frequencies, frames, outs)]
+
+    def getKey(self):
+        """
+            ## getKey()
+            identifies everything about the engine that changes the rendered wave, used as part of the sound cache key.
+        """
+        return self.name
+
+    def getFadeOutFrames(self, samplingRate : int):
+        return None if self.release is None else int(self.release * samplingRate)
+
+    def getScratch(self, shape : tuple):
+        """
+            ## getScratch()
+            returns a scratch array of shape that is reused between renders. Every thread gets its own, since notes can be rendered from the MIDI thread, the main thread and the mixer at once.
+        """
+        scratch = getattr(self.local, "scratch", None)
+        if scratch is None or scratch.shape != shape:
+            scratch = self.local.scratch = np.empty(shape)
+        return scratch
+
+    def makeOut(self, frames : int, out : np.array):
+        if out is None:
+            return np.zeros(frames)
+        out = out[:frames]
+        out.fill(0)
+        return out
+
+class LoopEngine(SynthesisEngine):
+    """
+        ## LoopEngine
+        the original synthesis loop, every harmonic (zeros included) is computed as a full length cosine and added onto the wave.
+    """
+    name = "Loop"
+
+    def render(self, frequency, harmonics, frames, samplingRate, start = 0, out = None, state = None):
+        out = self.makeOut(frames, out)
+        timeFrame = np.arange(start, start + frames) / samplingRate
+
+        for i, amplitude in enumerate(harmonics):
+            harmonicFrequency = frequency * (i + 1)
+            out += amplitude * np.cos(2 * np.pi * harmonicFrequency * timeFrame)
+
+        return out
+
+class BlockEngine(SynthesisEngine):
+    """
+        ## BlockEngine
+        vectorized additive synthesis. Zero harmonics are skipped and the rest are computed as a (frames x partials) matrix of cosines that is reduced with one matrix product.
+        The matrix is done in blocks of blockFrames x blockPartials, so memory stays the same no matter the duration or how many harmonics there are.
+    """
+    name = "Block"
+
+    def __init__(self, blockFrames : int = 4096, blockPartials : int = 16):
+        super().__init__()
+        self.blockFrames = blockFrames
+        self.blockPartials = blockPartials
+
+    def render(self, frequency, harmonics, frames, samplingRate, start = 0, out = None, state = None):
+        out = self.makeOut(frames, out)
+
+        harmonics = np.asarray(harmonics, dtype=np.float64)
+        partials = np.flatnonzero(harmonics) # the indexes of every harmonic that actually adds something
+        if len(partials) == 0:
+            return out
+
+        amplitudes = harmonics[partials]
+        scratch = self.getScratch((self.blockFrames, self.blockPartials)) # matrix of phases reused by every block
+        angularSteps = 2 * np.pi * frequency * (partials + 1) / samplingRate # phase advanced per frame for each partial
+
+        for frameStart in range(0, frames, self.blockFrames):
+            frameEnd = min(frames, frameStart + self.blockFrames)
+            frameIndexes = np.arange(start + frameStart, start + frameEnd, dtype=np.float64)
+            outBlock = out[frameStart:frameEnd]
+
+            for partialStart in range(0, len(partials), self.blockPartials):
+                partialEnd = min(len(partials), partialStart + self.blockPartials)
+                phases = scratch[:frameEnd - frameStart, :partialEnd - partialStart]
+
+                np.multiply.outer(frameIndexes, angularSteps[partialStart:partialEnd], out=phases)
+                np.cos(phases, out=phases)
+                outBlock += phases @ amplitudes[partialStart:partialEnd]
+
+        return out
+
+class RecurrenceEngine(SynthesisEngine):
+    """
+        ## RecurrenceEngine
+        additive synthesis with only one cosine per frame. cos(n * theta) is a Chebyshev polynomial of cos(theta), so the whole harmonic sum is evaluated with Clenshaw's recurrence
+        (b[n] = a[n] + 2x * b[n+1] - b[n+2]), which is a couple of multiply-adds per harmonic instead of a cosine per harmonic.
+        Harmonics past the last non zero one are skipped and the frames are done in blocks of blockFrames so memory stays bounded.
+    """
+    name = "Recurrence"
+
+    def __init__(self, blockFrames : int = BLOCK_FRAMES):
+        super().__init__()
+        self.blockFrames = blockFrames
+
+    def render(self, frequency, harmonics, frames, samplingRate, start = 0, out = None, state = None):
+        out = self.makeOut(frames, out)
+
+        harmonics = np.asarray(harmonics, dtype=np.float64)
+        partials = np.flatnonzero(harmonics)
+        if len(partials) == 0:
+            return out
+        harmonics = harmonics[:partials[-1] + 1] # trailing zeros add nothing
+
+        angularStep = 2 * np.pi * frequency / samplingRate
+        scratch = self.getScratch((5, self.blockFrames)) # x, 2x, a temporary and the two running b values, reused by every block
+
+        for frameStart in range(0, frames, self.blockFrames):
+            frameEnd = min(frames, frameStart + self.blockFrames)
+            x, twoX, temp, current, previous = scratch[:, :frameEnd - frameStart]
+
+            np.add(FRAME_OFFSETS[:frameEnd - frameStart], start + frameStart, out=x)
+            x *= angularStep
+            np.cos(x, out=x)
+            np.multiply(x, 2, out=twoX)
+            current.fill(0) # b[n+1]
+            previous.fill(0) # b[n+2]
+
+            # harmonics[i] is the amplitude of cos((i+1) * theta), so this walks n from the highest harmonic down to 1
+            for amplitude in harmonics[::-1]:
+                np.multiply(twoX, current, out=temp)
+                np.subtract(temp, previous, out=previous) # previous now holds b[n] = a[n] + 2x * b[n+1] - b[n+2]
+                previous += amplitude
+                current, previous = previous, current
+
+            # sum = x * b[1] - b[2]
+            outBlock = out[frameStart:frameEnd]
+            np.multiply(x, current, out=outBlock)
+            outBlock -= previous
+
+        return out
+
+    def renderBatch(self, frequencies, harmonics, frames, samplingRate, outs = None):
+        """
+            ## renderBatch()
+            the same recurrence as render(), but run on a (notes x blockFrames) matrix so every note of a chord shares one pass over the time axis.
+            The notes are sorted longest first, so the notes still playing in a block are always the first rows.
+        """
+        frames = np.asarray(frames, dtype=np.intp)
+        outs = [np.zeros(noteFrames) for noteFrames in frames] if outs is None else [out[:noteFrames] for out, noteFrames in zip(outs, frames)]
+
+        harmonics = np.asarray(harmonics, dtype=np.float64)
+        partials = np.flatnonzero(harmonics)
+        if len(partials) == 0 or len(frames) == 0:
+            for out in outs:
+                out.fill(0)
+            return outs
+        harmonics = harmonics[:partials[-1] + 1]
+
+        order = np.argsort(-frames, kind="stable") # longest note first
+        angularSteps = 2 * np.pi * np.asarray(frequencies, dtype=np.float64)[order] / samplingRate
+        sortedFrames = frames[order]
+        blockFrames = max(1024, self.blockFrames // len(frames)) # keeps the matrix about the size of one render() block
+        scratch = self.getScratch((5, len(frames), blockFrames))
+
+        for frameStart in range(0, sortedFrames[0], blockFrames):
+            frameEnd = frameStart + blockFrames
+            notes = np.count_nonzero(sortedFrames > frameStart) # how many notes are still going in this block
+            x, twoX, temp, current, previous = scratch[:, :notes]
+
+            np.multiply.outer(angularSteps[:notes], np.arange(frameStart, frameEnd, dtype=np.float64), out=x)
+            np.cos(x, out=x)
+            np.multiply(x, 2, out=twoX)
+            current.fill(0)
+            previous.fill(0)
+
+            for amplitude in harmonics[::-1]:
+                np.multiply(twoX, current, out=temp)
+                np.subtract(temp, previous, out=previous)
+                previous += amplitude
+                current, previous = previous, current
+
+            np.multiply(x, current, out=temp)
+            temp -= previous
+            for row in range(notes):
+                outBlock = outs[order[row]][frameStart:frameEnd]
+                outBlock[:] = temp[row, :len(outBlock)]
+
+        return outs
+
+class WavetableEngine(SynthesisEngine):
+    """
+        ## WavetableEngine
+        wavetable synthesis. The harmonics are turned into single cycle tables (with an inverse FFT) once per harmonics set, after that every note is a table read by phase increment,
+        so the cost per note only depends on the amount of frames and not on the amount of harmonics.
+        There is one table per octave, each one only keeps the harmonics that stay under the nyquist frequency for the highest note of its octave so high notes don't alias.
+    """
+    name = "Wavetable"
+
+    def __init__(self, tableSize : int = 4096, baseFrequency : float = 27.5, blockFrames : int = BLOCK_FRAMES):
+        super().__init__()
+        self.blockFrames = blockFrames
+        self.tableSize = tableSize
+        self.baseFrequency = baseFrequency # the top of the lowest octave, MIDI 21
+
+        self.harmonicsKey = None
+        self.tables = {} # octave -> single cycle table of tableSize + 1 frames (the last one wraps to the first for interpolation)
+
+    def setHarmonics(self, harmonics : list):
+        """
+            ## setHarmonics()
+            throws away the old tables if harmonics changed, tables are only built when an octave is first played.
+        """
+        key = fingerprint(harmonics)
+        if key != self.harmonicsKey:
+            self.harmonicsKey = key
+            self.tables = {}
+
+    def getOctave(self, frequency : float):
+        if frequency <= self.baseFrequency:
+            return 0
+        return math.ceil(math.log2(frequency / self.baseFrequency))
+
+    def getTable(self, harmonics : list, octave : int, samplingRate : int):
+        """
+            ## getTable()
+            returns the table for an octave, building it if it doesn't exist yet.
+        """
+        tableKey = (octave, samplingRate)
+        if tableKey in self.tables:
+            return self.tables[tableKey]
+
+        topFrequency = self.baseFrequency * 2 ** octave
+        maxHarmonic = min(len(harmonics), self.tableSize // 2 - 1, int((samplingRate / 2) / topFrequency)) # harmonics above this would alias on the highest note of the octave
+
+        spectrum = np.zeros(self.tableSize // 2 + 1)
+        spectrum[1:maxHarmonic + 1] = np.asarray(harmonics[:maxHarmonic], dtype=np.float64) * (self.tableSize / 2) # irfft of a/2 * size at bin i is a * cos(2pi * i * t)
+
+        table = np.empty(self.tableSize + 1)
+        table[:-1] = np.fft.irfft(spectrum, self.tableSize)
+        table[-1] = table[0]
+
+        self.tables[tableKey] = table
+        return table
+
+    def render(self, frequency, harmonics, frames, samplingRate, start = 0, out = None, state = None):
+        out = self.makeOut(frames, out)
+
+        self.setHarmonics(harmonics)
+        table = self.getTable(harmonics, self.getOctave(frequency), samplingRate)
+
+        phaseStep = frequency / samplingRate
+        phases, indexes = self.getScratch((2, self.blockFrames)), self.getIndexScratch()
+        for frameStart in range(0, frames, self.blockFrames):
+            frameEnd = min(frames, frameStart + self.blockFrames)
+            phase, step = phases[0, :frameEnd - frameStart], phases[1, :frameEnd - frameStart]
+            index = indexes[:frameEnd - frameStart]
+            outBlock = out[frameStart:frameEnd]
+
+            # position within the cycle for every frame, in table frames
+            np.add(FRAME_OFFSETS[:frameEnd - frameStart], start + frameStart, out=phase)
+            phase *= phaseStep
+            np.mod(phase, 1, out=phase)
+            phase *= self.tableSize
+
+            np.copyto(index, phase, casting="unsafe") # truncates to the table frame before the phase
+            phase -= index # fractional part, used to interpolate between index and index + 1
+
+            # out = table[index] + phase * (table[index + 1] - table[index])
+            np.take(table, index, out=step)
+            np.copyto(outBlock, step, casting="same_kind")
+            index += 1
+            np.take(table, index, out=step)
+            step -= outBlock
+            step *= phase
+            outBlock += step
+
+        return out
+
+    def getIndexScratch(self):
+        indexes = getattr(self.local, "indexes", None)
+        if indexes is None:
+            indexes = self.local.indexes = np.empty(self.blockFrames, dtype=np.intp)
+        return indexes
+
+class StringEngine(SynthesisEngine):
+    """
+        ## StringEngine
+        Karplus-Strong string. The harmonics are only used to pluck the string (the first loop of the delay line is the additive wave), after that every frame
+        is the frames one loop earlier passed through a loss filter, so the cost per frame doesn't depend on the amount of harmonics and the note decays by itself.
+        The loss filter damps high partials more than low ones, so the note also gets darker as it rings.
+        The delay line is advanced a whole loop (or several) per numpy call, frames within a loop don't depend on each other.
+    """
+    name = "String"
+    release = .05 # the string already decays, the fade out only keeps the cut at the end of the note from clicking
+    BRIGHTNESS_FREQUENCY = 5000 # brightness is how long a partial at this frequency rings compared to the fundamental
+
+    def __init__(self, decayTime : float = 3, brightness : float = .5, blockFrames : int = 64):
+        """
+            ### decayTime : float
+            seconds it takes the fundamental to drop by 60dB
+
+            ### brightness : float
+            the decay time of a partial at BRIGHTNESS_FREQUENCY as a part of decayTime, 1 doesn't damp the high partials any more than the fundamental
+
+            ### blockFrames : int
+            about the least frames computed per numpy call, short loops (high notes) are advanced several loops at a time to reach it
+        """
+        super().__init__()
+        self.decayTime = decayTime
+        self.brightness = min(max(brightness, .01), 1)
+        self.blockFrames = blockFrames
+
+    def getKey(self):
+        return (self.name, self.decayTime, self.brightness)
+
+    def getLoop(self, frequency : float, samplingRate : int):
+        """
+            ## getLoop()
+            returns (delay, taps), every frame n is the sum of taps[i] * y[n - delay - i]. The taps are an 8 point Lagrange interpolation (for the fraction of a frame
+            the loop is long) and a 3 point lowpass for the high partials, scaled so the fundamental decays in decayTime.
+            A shorter interpolation loses too much per loop, high notes go around the loop thousands of times a second.
+        """
+        # the lowpass delays by 1 frame and the interpolation by 3 to 4, the rest of the loop is the delay line
+        loopFrames = max(samplingRate / frequency, 5)
+        delay = int(loopFrames) - 4
+        fraction = loopFrames - delay - 1
+        interpolation = np.array([np.prod([(fraction - j) / (k - j) for j in range(8) if j != k]) for k in range(8)])
+
+        # damping that grows with the square of the frequency, like a string's internal friction, a loop is 1 / frequency seconds long
+        damping = math.log(1000) / self.decayTime * (1 / self.brightness - 1) / self.BRIGHTNESS_FREQUENCY ** 2
+        side = min(damping * samplingRate ** 2 / ((2 * np.pi) ** 2 * frequency), .25)
+        lowpass = np.array([side, 1 - 2 * side, side])
+
+        taps = np.convolve(interpolation, lowpass)
+        loss = abs(np.polyval(taps[::-1], np.exp(-2j * np.pi * frequency / samplingRate))) # how much the fundamental loses per loop to the filters alone
+        gain = min(10 ** (-3 / (self.decayTime * frequency)) / loss, .99999) # -60dB after decayTime seconds
+        return delay, gain * taps
+
+    def pluck(self, frequency : float, harmonics : list, frames : int, samplingRate : int):
+        # the additive wave for the first frames, harmonics above nyquist are left out since the loop would keep them ringing
+        harmonics = np.asarray(harmonics, dtype=np.float64)[:int((samplingRate / 2) / frequency)]
+        partials = np.flatnonzero(harmonics)
+        times = np.arange(frames, dtype=np.float64) * (2 * np.pi * frequency / samplingRate)
+        return np.cos(np.multiply.outer(times, partials + 1)) @ harmonics[partials]
+
+    def render(self, frequency, harmonics, frames, samplingRate, start = 0, out = None, state = None):
+        out = self.makeOut(frames, out)
+        if frames <= 0:
+            return out
+
+        delay, taps = self.getLoop(frequency, samplingRate)
+        spread = len(taps) - 1
+        pluckFrames = delay + spread # one loop plus the frames the filters reach back
+        maxLoops = max(1, -(-self.blockFrames // delay))
+        historyFrames = maxLoops * pluckFrames # the most a block reaches back
+        end = start + frames
+
+        # continues from where the last piece of the note ended (the end of its delay line is kept in state), otherwise the note is run from its start
+        if state is not None and state.get("end") == start:
+            base, history = state["base"], state["history"]
+            wave = np.empty(end - base)
+            wave[:len(history)] = history
+            position = start
+        else:
+            base = 0
+            wave = np.empty(end)
+            wave[:min(pluckFrames, end)] = self.pluck(frequency, harmonics, min(pluckFrames, end), samplingRate)
+            position = pluckFrames
+
+        # taps for advancing several loops in one step, only used once the frames they reach back to all came from the loop itself
+        loopTaps = [None, taps]
+        while position < end:
+            loops = min(maxLoops, (position - pluckFrames) // pluckFrames + 1)
+            while len(loopTaps) <= loops:
+                loopTaps.append(np.convolve(loopTaps[-1], taps))
+            blockFrames = min(loops * delay, end - position)
+            reach = position - base - loops * pluckFrames
+            wave[position - base:position - base + blockFrames] = np.convolve(wave[reach:reach + blockFrames + loops * spread], loopTaps[loops], "valid")
+            position += blockFrames
+
+        if state is not None:
+            historyStart = max(base, end - historyFrames)
+            state.update(end=end, base=historyStart, history=wave[historyStart - base:].copy())
+
+        out[:] = wave[start - base:]
+        return out
+
+ENGINES = {
+    LoopEngine.name : LoopEngine,
+    BlockEngine.name : BlockEngine,
+    RecurrenceEngine.name : RecurrenceEngine,
+    WavetableEngine.name : WavetableEngine,
+    StringEngine.name : StringEngine,
+}
+
+def getEngine(name : str, **parameters):
+    """
+        ## getEngine()
+        makes a new synthesis engine from its name (a key of ENGINES), parameters are passed on to the engine (like StringEngine's decayTime).
+    """
+    if name not in ENGINES:
+        raise NameError(f"{name} is not a valid synthesis engine, expected one of {list(ENGINES)}.")
+    return ENGINES[name](**parameters)
+
+def applyEnvelope(wave : np.array, frames : int, start : int = 0, fadeOutFrames : int = None):
+    """
+        ## applyEnvelope()
+        multiplies wave in place by the note envelope, a linear fade in over FADE_IN_FRAMES followed by a linear fade out to the end of the note.
+
+        ### wave : np.array
+        the part of the note to apply the envelope to
+
+        ### frames : int
+        the length of the whole note
+
+        ### start : int
+        the index of wave[0] within the whole note
+        defaults to 0
+
+        ### fadeOutFrames : int
+        how long the fade out at the end of the note is, everything after the fade in if None (see SynthesisEngine.release)
+        defaults to None
+    """
+    fadeIn = min(FADE_IN_FRAMES, frames)
+    fadeOutStart = fadeIn if fadeOutFrames is None else max(fadeIn, frames - fadeOutFrames)
+    fadeOut = frames - fadeOutStart
+    end = start + len(wave)
+
+    # 0 -> 1 over the fade in, short enough that a small temporary array doesn't matter
+    if start < fadeIn:
+        wave[:min(end, fadeIn) - start] *= np.arange(start, min(end, fadeIn)) / max(fadeIn - 1, 1)
+
+    # 1 -> 0 over the fade out, built a block at a time in a reused scratch array
+    ramp = getattr(LOCAL, "ramp", None)
+    if ramp is None:
+        ramp = LOCAL.ramp = np.empty(BLOCK_FRAMES)
+    slope = -1 / max(fadeOut - 1, 1)
+    for blockStart in range(max(start, fadeOutStart), end, BLOCK_FRAMES):
+        blockEnd = min(end, blockStart + BLOCK_FRAMES)
+        blockRamp = ramp[:blockEnd - blockStart]
+        np.add(FRAME_OFFSETS[:blockEnd - blockStart], blockStart - fadeOutStart, out=blockRamp)
+        blockRamp *= slope
+        blockRamp += 1
+        wave[blockStart - start:blockEnd - start] *= blockRamp
+
+    return wave
+
+def toInt16(wave : np.array, out : np.array = None):
+    """
+        ## toInt16()
+        maps a -1 to 1 wave to the min and max of a 16 bit int (32768), clipping anything outside of that range instead of letting it wrap around.
+
+        ### out : np.array
+        int16 array to write into, either mono (frames) or stereo (frames, 2) in which case both channels get the wave. wave is used as scratch space when this is given.
+        A new mono array is made if None
+        defaults to None
+    """
+    if out is None:
+        return np.clip(32768 * wave, -32768, 32767).astype(np.int16)
+
+    wave *= 32768
+    np.clip(wave, -32768, 32767, out=wave)
+    if out.ndim == 1:
+        np.copyto(out, wave, casting="unsafe")
+    else:
+        np.copyto(out[:, 0], wave, casting="unsafe")
+        out[:, 1] = out[:, 0]
+    return out
+
+class ScratchPool:
+    def __init__(self, minFrames : int = 4096):
+        """
+            ## ScratchPool
+            float32 scratch arrays for whole notes, one per duration bucket (the next power of two of frames) and per thread, so rendering a note doesn't allocate a new wave every time.
+
+            ### minFrames : int
+            size of the smallest bucket
+        """
+        self.minFrames = minFrames
+        self.local = threading.local()
+
+    def get(self, frames : int):
+        """
+            ## get()
+            returns a float32 scratch array of frames length. It is only valid until the next get() from the same thread.
+        """
+        buckets = getattr(self.local, "buckets", None)
+        if buckets is None:
+            buckets = self.local.buckets = {}
+
+        bucket = max(self.minFrames, 1 << max(frames - 1, 0).bit_length())
+        if bucket not in buckets:
+            buckets[bucket] = np.empty(bucket, dtype=np.float32)
+        return buckets[bucket][:frames]
+
+    def getBytes(self):
+        return sum(array.nbytes for array in getattr(self.local, "buckets", {}).values())
+
+SCRATCH_POOL = ScratchPool()
+
+def renderNote(engine : SynthesisEngine,
+               frequency : float,
+               duration : float,
+               strength : float,
+               harmonics : list,
+               samplingRate : int):
+    """
+        ## renderNote()
+        renders a whole note to a mono int16 wave. Only needs numpy, so it can be used without pygame.
+
+        ### engine : SynthesisEngine
+        the engine that sums the harmonics
+
+        ### frequency : float
+        the fundamental frequency
+
+        ### duration : float
+        length of the note in seconds
+
+        ### strength : float
+        the volume of the note, capped at 1
+
+        ### harmonics : list
+        the amplitude of every harmonic, harmonics[0] is the fundamental
+
+        ### samplingRate : int
+        frames per second
+    """
+    frames = int(duration * samplingRate)
+
+    wave = engine.render(frequency, harmonics, frames, samplingRate)
+    wave *= (strength if strength <= 1 else 1)
+    applyEnvelope(wave, frames, fadeOutFrames=engine.getFadeOutFrames(samplingRate))
+
+    return toInt16(wave)
+
+def renderNoteInto(engine : SynthesisEngine,
+                   out : np.array,
+                   frequency : float,
+                   strength : float,
+                   harmonics : list,
+                   samplingRate : int,
+                   pool : ScratchPool = SCRATCH_POOL):
+    """
+        ## renderNoteInto()
+        renderNote() without the allocations. The note is rendered in float32 in a pooled scratch array with in place steps and the int16 samples are written straight into out,
+        which is usually the stereo buffer of the pygame Sound that will play it (pygame.sndarray.samples()).
+
+        ### out : np.array
+        the int16 array to write into, (frames) or (frames, 2), its length is the length of the note
+
+        ### pool : ScratchPool
+        where the float32 scratch array comes from
+        defaults to SCRATCH_POOL
+    """
+    frames = len(out)
+
+    wave = engine.render(frequency, harmonics, frames, samplingRate, out=pool.get(frames))
+    wave *= (strength if strength <= 1 else 1)
+    applyEnvelope(wave, frames, fadeOutFrames=engine.getFadeOutFrames(samplingRate))
+
+    return toInt16(wave, out)
+
+def renderNotes(engine : SynthesisEngine,
+                frequencies : list,
+                durations : list,
+                strengths : list,
+                harmonics : list,
+                samplingRate : int):
+    """
+        ## renderNotes()
+        batch version of renderNote(), renders every note of a chord in one engine call and returns a separate mono int16 wave for each.
+
+        ### frequencies : list
+        the fundamental frequency of every note
+
+        ### durations : list
+        the length of every note in seconds
+
+        ### strengths : list
+        the volume of every note, capped at 1
+    """
+    frames = [int(duration * samplingRate) for duration in durations]
+    waves = engine.renderBatch(frequencies, harmonics, frames, samplingRate)
+
+    for wave, noteFrames, strength in zip(waves, frames, strengths):
+        wave *= (strength if strength <= 1 else 1)
+        applyEnvelope(wave, noteFrames, fadeOutFrames=engine.getFadeOutFrames(samplingRate))
+
+    return [toInt16(wave) for wave in waves]
+
+def renderNotesInto(engine : SynthesisEngine,
+                    outs : list,
+                    frequencies : list,
+                    strengths : list,
+                    harmonics : list,
+                    samplingRate : int,
+                    pool : ScratchPool = SCRATCH_POOL):
+    """
+        ## renderNotesInto()
+        renderNotes() without the allocations, the batch version of renderNoteInto(). Every note is rendered in float32 in its own part of one pooled scratch array
+        and its int16 samples are written straight into its out.
+
+        ### outs : list
+        the int16 array to write every note into, (frames) or (frames, 2), their lengths are the lengths of the notes
+
+        ### pool : ScratchPool
+        where the float32 scratch array comes from
+        defaults to SCRATCH_POOL
+    """
+    frames = [len(out) for out in outs]
+    scratch = pool.get(sum(frames))
+    starts = np.cumsum([0] + frames)
+    waves = engine.renderBatch(frequencies, harmonics, frames, samplingRate, [scratch[start:start + noteFrames] for start, noteFrames in zip(starts, frames)])
+
+    for wave, out, strength in zip(waves, outs, strengths):
+        wave *= (strength if strength <= 1 else 1)
+        applyEnvelope(wave, len(out), fadeOutFrames=engine.getFadeOutFrames(samplingRate))
+        toInt16(wave, out)
+
+    return outs
+
+def streamNote(engine : SynthesisEngine,
+               frequency : float,
+               duration : float,
+               strength : float,
+               harmonics : list,
+               samplingRate : int,
+               chunkFrames : int = 4096):
+    """
+        ## streamNote()
+        generator version of renderNote(), yields the note as mono int16 chunks of chunkFrames with the envelope applied as it goes.
+        Only one chunk is rendered at a time, so the time to the first sample and the memory used don't depend on the duration.
+
+        ### chunkFrames : int
+        frames per yielded chunk, the last one can be shorter
+        defaults to 4096
+    """
+    frames = int(duration * samplingRate)
+    scratch = np.empty(chunkFrames) # float chunk reused for every render
+    state = {} # whatever the engine carries from one chunk to the next, it goes with the generator so any thread can render the next chunk
+
+    for start in range(0, frames, chunkFrames):
+        chunk = engine.render(frequency, harmonics, min(chunkFrames, frames - start), samplingRate, start, scratch, state)
+        chunk *= (strength if strength <= 1 else 1)
+        applyEnvelope(chunk, frames, start, engine.getFadeOutFrames(samplingRate))
+        yield toInt16(chunk)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the modules live in the repository's root, and pygame has to run without a window or a sound card
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
@@ -0,0 +1,59 @@
+import os
+import json
+import time
+import numpy as np
+import bank
+from bank import BankManager, buildBank, fitSample, getBankName, BANK_VERSION
+from synthesis import getEngine, renderNote
+
+def test_fit_sample_matches_a_shorter_render():
+    engine = getEngine("Recurrence")
+    harmonics = [1, .5, 0, .25]
+    sample = renderNote(engine, 220, 2, .5, harmonics, 44100) # quiet enough that neither note clips
+    for duration in (.002, .5, 1.5):
+        frames = int(duration * 44100)
+        rendered = renderNote(engine, 220, duration, .5, harmonics, 44100)
+        fitted = fitSample(sample, frames, engine.getFadeOutFrames(44100))
+        assert fitted.dtype == np.int16 and len(fitted) == frames
+        assert np.abs(fitted.astype(np.int32) - rendered).max() <= 1
+
+def test_cancelled_build_leaves_nothing_behind(tmp_path):
+    directory = buildBank(str(tmp_path), [1, .5], velocities=(64,), mults=(1,), processes=1, cancelled=lambda: True)
+    assert directory is None
+    assert os.listdir(tmp_path) == []
+
+def fakeBuild(builds):
+    # writes an empty bank instead of rendering one
+    def build(root, harmonics, synthMode, samplingRate, processes = None, cancelled = None):
+        builds.append(list(harmonics))
+        directory = os.path.join(root, getBankName(harmonics, synthMode, samplingRate))
+        os.makedirs(directory)
+        with open(os.path.join(directory, "manifest.json"), "w") as file:
+            json.dump({"version" : BANK_VERSION, "synthMode" : synthMode, "samplingRate" : samplingRate, "velocities" : [64], "mults" : [1]}, file)
+        return directory
+    return build
+
+def test_manager_only_builds_the_last_harmonics(tmp_path, monkeypatch):
+    builds = []
+    monkeypatch.setattr(bank, "buildBank", fakeBuild(builds))
+    manager = BankManager(str(tmp_path), debounce=.1)
+    for harmonics in ([1], [1, .5], [1, .5, .25]):
+        manager.setHarmonics(harmonics)
+    deadline = time.perf_counter() + 5
+    while manager.getBank() is None and time.perf_counter() < deadline:
+        time.sleep(.01)
+    assert manager.getBank() is not None
+    assert builds == [[1, .5, .25]]
+
+def test_manager_prunes_superseded_banks(tmp_path):
+    names = [getBankName([1, i], "Recurrence", 44100) for i in range(4)]
+    other = getBankName([1], "String", 44100) # a different synth mode isn't touched
+    for age, name in enumerate(names[:3] + [other]):
+        os.makedirs(os.path.join(tmp_path, name))
+        os.utime(os.path.join(tmp_path, name), (1000 + age, 1000 + age))
+    fakeBuild([])(str(tmp_path), [1, 3], "Recurrence", 44100)
+
+    manager = BankManager(str(tmp_path), keepBanks=2)
+    manager.setHarmonics([1, 3]) # already built, opened right away
+    assert manager.getBank() is not None
+    assert sorted(os.listdir(tmp_path)) == sorted([names[2], names[3], other])
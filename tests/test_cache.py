@@ -0,0 +1,16 @@
+import numpy as np
+from cache import SoundCache
+
+def test_views_are_counted_by_their_whole_buffer():
+    cache = SoundCache()
+    stereo = np.zeros((1000, 2), dtype=np.int16)
+    assert cache.sizeOf(stereo[:, 0]) == stereo.nbytes # the left channel keeps the whole stereo buffer alive
+    assert cache.sizeOf(np.zeros(1000, dtype=np.int16)) == 2000
+    assert cache.sizeOf(np.zeros(1000, dtype=np.int16), sound=bytes(4000)) == 6000 # a separate stereo copy
+
+def test_byte_limit_evicts_the_oldest():
+    cache = SoundCache(maxBytes=10000)
+    for key in range(3):
+        cache.put(key, np.zeros((1000, 2), dtype=np.int16)[:, 0], None) # 4000 bytes each
+    assert 0 not in cache and 1 in cache and 2 in cache
+    assert cache.getStats()["bytes"] == 8000 and cache.getStats()["evictions"] == 1
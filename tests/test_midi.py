@@ -0,0 +1,110 @@
+import time
+import mido
+from midi import FakePort, LatencyTracker
+from notes import Note
+from render import SUSTAIN_MULT
+
+def waitFor(condition, timeout : float = 5):
+    deadline = time.perf_counter() + timeout
+    while not condition() and time.perf_counter() < deadline:
+        time.sleep(.01)
+    return condition()
+
+def test_fake_port_notes_are_played_and_timed():
+    note = Note(outputMode="Mixer")
+    port = FakePort()
+    ingest = note.keyboardInput(port)
+    try:
+        for pitch in (60, 64, 67):
+            port.send(mido.Message("note_on", note=pitch, velocity=80))
+        port.send(mido.Message("note_on", note=72, velocity=0)) # a note_off, not played
+
+        assert waitFor(lambda: note.latency.getPercentiles("play")["count"] == 3)
+        stats = note.latency.getStats()
+        assert stats["synthesis"]["count"] == 3
+        assert 0 <= stats["synthesis"]["p50"] <= stats["play"]["p50"]
+        assert ingest.dropped == 0
+        assert len(note.voices) == 3
+    finally:
+        ingest.stop()
+        note.mixer.stop()
+    assert ingest.usesCallback and port.callback is None and not port.closed
+    assert not ingest.workerThread.is_alive()
+
+class BlockingPort:
+    # a port without a callback, like mido's pygame ports, read by the listener thread
+    def __init__(self):
+        self.port = FakePort()
+        self.name = self.port.name
+        self.send = self.port.send
+        self.receive = self.port.receive
+        self.close = self.port.close
+
+def test_ports_without_callbacks_are_read_by_a_listener():
+    note = Note(outputMode="Mixer")
+    port = BlockingPort()
+    ingest = note.keyboardInput(port)
+    try:
+        assert not ingest.usesCallback
+        port.send(mido.Message("note_on", note=60, velocity=80))
+        assert waitFor(lambda: len(note.voices) == 1)
+    finally:
+        ingest.stop()
+        note.mixer.stop()
+    assert port.port.closed # closing the port is what ends the blocked receive()
+    assert not ingest.listenerThread.is_alive() and not ingest.workerThread.is_alive()
+
+def test_sustain_pedal_lengthens_notes():
+    note = Note(outputMode="Mixer")
+    port = FakePort()
+    ingest = note.keyboardInput(port)
+    try:
+        port.send(mido.Message("note_on", note=60, velocity=80))
+        port.send(mido.Message("control_change", control=64, value=127))
+        port.send(mido.Message("note_on", note=62, velocity=80))
+        assert waitFor(lambda: len(note.voices) == 2)
+        voices, _ = note.voices.readSince(0)
+        assert [voice.duration for voice in voices] == [.8, .8 * SUSTAIN_MULT]
+    finally:
+        ingest.stop()
+        note.mixer.stop()
+
+def test_latency_tracker_percentiles():
+    tracker = LatencyTracker(window=4)
+    for seconds in (.001, .002, .003, .004, .005): # the first falls out of the window
+        tracker.record("play", seconds)
+    percentiles = tracker.getPercentiles("play", (50,))
+    assert percentiles["count"] == 4
+    assert abs(percentiles["p50"] - 3.5) < 1e-9
+    assert tracker.getPercentiles("synthesis")["p50"] is None
+
+def test_notes_off_the_keyboard_are_skipped():
+    note = Note(outputMode="Mixer")
+    port = FakePort()
+    ingest = note.keyboardInput(port)
+    try:
+        port.send(mido.Message("note_on", note=12, velocity=80)) # below the piano's lowest key
+        port.send(mido.Message("note_on", note=60, velocity=80))
+        assert waitFor(lambda: len(note.voices) == 1)
+        assert ingest.workerThread.is_alive() and ingest.errors == 0
+    finally:
+        ingest.stop()
+        note.mixer.stop()
+
+def test_a_failing_batch_does_not_stop_the_worker():
+    note = Note(outputMode="Mixer")
+    playMidiNotes = note.playMidiNotes
+    def failOnce(messages):
+        note.playMidiNotes = playMidiNotes
+        raise RuntimeError("bad batch")
+    note.playMidiNotes = failOnce
+    port = FakePort()
+    ingest = note.keyboardInput(port)
+    try:
+        port.send(mido.Message("note_on", note=60, velocity=80))
+        assert waitFor(lambda: ingest.errors == 1)
+        port.send(mido.Message("note_on", note=64, velocity=80))
+        assert waitFor(lambda: len(note.voices) == 1)
+    finally:
+        ingest.stop()
+        note.mixer.stop()
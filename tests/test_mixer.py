@@ -0,0 +1,61 @@
+import numpy as np
+from mixer import Mixer, NullSink, OutputTap, StreamVoice
+
+def makeMixer(polyphony : int = 4, blockSize : int = 256):
+    return Mixer(44100, blockSize, polyphony, NullSink(44100))
+
+def test_voices_are_summed_and_clipped():
+    mixer = makeMixer()
+    mixer.addVoice(np.full(256, 20000, dtype=np.int16))
+    mixer.addVoice(np.full(256, 20000, dtype=np.int16), .5)
+    block = mixer.callback(mixer.makeBlock())
+    assert (block == 30000).all()
+
+    mixer.addVoice(np.full(256, 20000, dtype=np.int16))
+    mixer.addVoice(np.full(256, 20000, dtype=np.int16))
+    assert (mixer.callback(mixer.makeBlock()) == 32767).all()
+
+def test_finished_voices_are_removed():
+    mixer = makeMixer()
+    mixer.addVoice(np.ones(300, dtype=np.int16))
+    mixer.renderFrames(256)
+    assert mixer.getActiveVoices() == 1
+    mixer.renderFrames(256)
+    assert mixer.getActiveVoices() == 0
+    assert mixer.sink.framesWritten == 512
+
+def test_quietest_voice_is_stolen():
+    mixer = makeMixer(polyphony=2)
+    loud = mixer.addVoice(np.full(4096, 30000, dtype=np.int16))
+    quiet = mixer.addVoice(np.full(4096, 100, dtype=np.int16))
+    mixer.renderFrames(256)
+
+    new = mixer.addVoice(np.full(4096, 1000, dtype=np.int16))
+    assert mixer.steals == 1
+    assert loud in mixer.voices and new in mixer.voices and quiet not in mixer.voices
+
+def test_tap_gets_the_mix_and_tracks_its_peak():
+    mixer = makeMixer()
+    tap = mixer.addTap(OutputTap(capacity=1024))
+    wave = (np.sin(np.arange(2048) / 10) * 12000).astype(np.int16)
+    mixer.addVoice(wave)
+    mixer.renderFrames(512)
+
+    assert np.array_equal(tap.getLatest(512), wave[:512])
+    assert np.array_equal(tap.getLatest(256, delayFrames=256), wave[:256])
+    assert tap.getPeak() == np.abs(wave[:512]).max()
+    assert not tap.isSilent()
+
+    mixer.renderFrames(44100 * 5) # the peak falls off once the voice ended
+    assert tap.isSilent()
+
+def test_stream_voice_plays_its_chunks_in_order():
+    chunks = [np.full(100, i + 1, dtype=np.int16) for i in range(5)]
+    mixer = makeMixer()
+    tap = mixer.addTap(OutputTap(capacity=512))
+    voice = mixer.startVoice(StreamVoice(iter(chunks))) # no feed thread, the chunks are rendered as the mix reaches them
+    mixer.renderFrames(512)
+    assert np.array_equal(tap.getLatest(500, delayFrames=12), np.concatenate(chunks))
+    assert (tap.getLatest(12) == 0).all()
+    assert voice.isDone()
+    assert mixer.getActiveVoices() == 0
@@ -0,0 +1,20 @@
+import os
+import sys
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_making_notes_does_not_load_pygame():
+    # in a fresh process without the dummy SDL drivers, so nothing is there to hide an audio device being opened
+    code = "\n".join([
+        "import threading",
+        "import globals as gb",
+        "from notes import Note, StringNote",
+        "Note()",
+        "StringNote()",
+        "assert not gb.pygame.isLoaded()",
+        "assert threading.active_count() == 1, threading.enumerate()",
+    ])
+    environment = {name : value for name, value in os.environ.items() if not name.startswith("SDL_")}
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=environment, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
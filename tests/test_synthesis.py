@@ -0,0 +1,16 @@
+import threading
+import numpy as np
+from synthesis import getEngine, renderNote, streamNote
+
+def test_string_stream_continues_on_any_thread():
+    harmonics = [1, .5, 0, .25]
+    chunks = streamNote(getEngine("String"), 55, 2, .8, harmonics, 44100, 4096)
+    streamed = []
+    def renderNext():
+        streamed.append(next(chunks, None))
+    while len(streamed) == 0 or streamed[-1] is not None: # every chunk on a new thread, the way the mixer's threads take turns
+        thread = threading.Thread(target=renderNext)
+        thread.start()
+        thread.join()
+    whole = renderNote(getEngine("String"), 55, 2, .8, harmonics, 44100)
+    assert np.array_equal(np.concatenate(streamed[:-1]), whole)
@@ -1,30 +1,102 @@
-import pygame
-from pygame import Vector2
+from __future__ import annotations # keeps the pygame annotations from loading pygame
+from collections import OrderedDict
 import globals as gb
+from globals import pygame
+from profiler import PROFILER
 
 class Text:
-    def __init__(self, 
-                 pos : tuple|Vector2 = None,
+    def __init__(self,
+                 pos : tuple|pygame.Vector2 = None,
                  staticPos : bool = False,
                  lineSpacing : int = 4,
-                 color : tuple = (255, 255, 255)):
+                 color : tuple = (255, 255, 255),
+                 maxCachedLines : int = 128,
+                 composeBlock : bool = True):
         self.text = ""
         self.pos = pos
         self.staticPos = staticPos
         self.lineSpacing = lineSpacing
         self.color = color
 
+        # rendered line surfaces keyed on (line, color), least recently used first
+        self.lineCache = OrderedDict()
+        self.maxCachedLines = maxCachedLines
+
+        # all of the lines drawn onto one surface, so an unchanged text is a single blit
+        self.composeBlock = composeBlock
+        self.blockSurface = None
+        self.blockKey = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.blockHits = 0
+
+    def renderLine(self, line : str):
+        """
+            ## renderLine
+            returns the rendered surface of line, only rendering it with the font if it isn't cached already.
+        """
+        key = (line, self.color)
+        surface = self.lineCache.get(key)
+        if surface != None:
+            self.lineCache.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface = gb.FONT.render(line, True, self.color)
+        self.lineCache[key] = surface
+        if len(self.lineCache) > self.maxCachedLines:
+            self.lineCache.popitem(last=False)
+            self.evictions += 1
+        return surface
+
+    def getBlock(self):
+        """
+            ## getBlock
+            returns one surface with every line of self.text on it, rebuilt only when the text, color or spacing changed.
+        """
+        key = (self.text, self.color, self.lineSpacing)
+        if self.blockSurface != None and key == self.blockKey:
+            self.blockHits += 1
+            return self.blockSurface
+
+        renderedLines = [self.renderLine(line) for line in self.text.split("\n")]
+        lineHeight = renderedLines[0].get_height()
+        self.blockSurface = pygame.Surface((max(line.get_width() for line in renderedLines), len(renderedLines) * lineHeight + self.lineSpacing), pygame.SRCALPHA)
+        for i, renderedText in enumerate(renderedLines):
+            self.blockSurface.blit(renderedText, (0, i * renderedText.get_height() + self.lineSpacing))
+        self.blockKey = key
+        return self.blockSurface
+
     def draw(self, screen):
+        if self.composeBlock:
+            screen.blit(self.getBlock(), self.pos)
+            return
+
         lines = self.text.split("\n")
         for i, line in enumerate(lines):
-            renderedText = gb.FONT.render(line, True, self.color)
-            screen.blit(renderedText, self.pos + Vector2(0, i * renderedText.get_height() + self.lineSpacing))
+            renderedText = self.renderLine(line)
+            screen.blit(renderedText, self.pos + pygame.Vector2(0, i * renderedText.get_height() + self.lineSpacing))
+
+    def getStats(self):
+        lookups = self.hits + self.misses
+        return {
+            "cachedLines" : len(self.lineCache),
+            "hits" : self.hits,
+            "misses" : self.misses,
+            "evictions" : self.evictions,
+            "hitRate" : self.hits / lookups if lookups > 0 else 0,
+            "blockHits" : self.blockHits,
+        }
 
-    def update(self, 
+    def update(self,
                screen,
-               text : str, 
-               pos : Vector2 = None):
-        self.text = text
-        if not self.staticPos:
-            self.pos = Vector2(pos)
-        self.draw(screen)
\ No newline at end of file
+               text : str,
+               pos : pygame.Vector2 = None):
+        with PROFILER.scope("text"):
+            self.text = text
+            if not self.staticPos:
+                self.pos = pygame.Vector2(pos)
+            self.draw(screen)
@@ -0,0 +1,83 @@
+import threading
+
+class Voice:
+    __slots__ = ("frequency", "velocity", "strength", "duration", "startTime", "wave", "sound")
+
+    def __init__(self,
+                 frequency : float,
+                 velocity : int,
+                 strength : float,
+                 duration : float,
+                 startTime : float,
+                 wave = None,
+                 sound = None):
+        """
+            ## Voice
+            one played note, made by whichever thread played it and never changed afterwards, so it can be read from any thread without a lock.
+
+            ### velocity : int
+            the MIDI velocity, None for notes that didn't come from MIDI
+
+            ### startTime : float
+            time.time() of when the note started playing
+
+            ### wave : np.array
+            the played int16 wave, None for notes that were streamed
+            defaults to None
+
+            ### sound : pygame.mixer.Sound
+            the Sound the wave belongs to, None when it was played through the mixer or from the sample bank
+            defaults to None
+        """
+        setAttribute = object.__setattr__
+        setAttribute(self, "frequency", frequency)
+        setAttribute(self, "velocity", velocity)
+        setAttribute(self, "strength", strength)
+        setAttribute(self, "duration", duration)
+        setAttribute(self, "startTime", startTime)
+        setAttribute(self, "wave", wave)
+        setAttribute(self, "sound", sound)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"Voice is read only, make a new one instead of setting {name}.")
+
+    def getFrames(self):
+        return 0 if self.wave is None else len(self.wave)
+
+class VoiceRing:
+    def __init__(self, capacity : int = 64):
+        """
+            ## VoiceRing
+            fixed size ring of the most recently played voices, written by the MIDI thread and read by the main thread. Writing never waits on a reader,
+            when the ring is full the oldest voice is overwritten, and readers keep their own position so any amount of them can read the same voices.
+
+            ### capacity : int
+            how many voices are kept
+        """
+        self.capacity = capacity
+        self.slots = [None] * capacity
+        self.written = 0 # total voices ever pushed, the slot of voice i is i % capacity
+        self.lock = threading.Lock()
+
+    def push(self, voice : Voice):
+        with self.lock:
+            self.slots[self.written % self.capacity] = voice
+            self.written += 1
+
+    def readSince(self, position : int):
+        """
+            ## readSince()
+            returns (voices, position), the voices pushed since position (oldest first) and the position to read from next time.
+            Voices that were already overwritten are skipped.
+        """
+        with self.lock:
+            start = max(position, self.written - self.capacity)
+            voices = [self.slots[i % self.capacity] for i in range(start, self.written)]
+            return voices, self.written
+
+    def getLatest(self):
+        with self.lock:
+            return self.slots[(self.written - 1) % self.capacity] if self.written > 0 else None
+
+    def __len__(self):
+        return min(self.written, self.capacity)